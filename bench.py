@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for ding.
+
+Usage: python bench.py <benchmark> [options]
+
+    contexts   probe context reuse vs per-probe setup
+    render     bytes written by the full vs diff-based renderer
+    bars       cached latency bars vs per-sample formatting
+    sim        scheduler, state machine and renderer at 10 / 1,000 / 10,000
+               hosts against a deterministic simulated network; --json for CI
+    startup    import time and import-to-first-probe latency in a fresh
+               interpreter
+"""
+import argparse
+import collections
+import heapq
+import io
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import ding
+
+
+# --- Probe contexts (handle / socket / buffer reuse) ---
+class CountingContext(ding.ProbeContext):
+    """Stand-in for an ICMP handle + buffers; counts the 'syscalls' it costs."""
+    opened = 0
+    closed = 0
+
+    def __init__(self):
+        CountingContext.opened += 1
+        self.payload = bytearray(ding.PING_PAYLOAD)
+        self.reply_buf = bytearray(64)
+
+    def close(self):
+        CountingContext.closed += 1
+
+
+class FakeBackend(ding.PingBackend):
+    """Backend that answers instantly, so only per-probe overhead is measured."""
+    name = "fake"
+
+    def new_context(self):
+        return CountingContext()
+
+    def ping_with(self, ctx, host, ip, options):
+        ctx.reply_buf[:len(ctx.payload)] = ctx.payload
+        return ding.Ping_result(0, 1, host)
+
+
+def _run_probes(backend, host, probes, workers):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        results = list(ex.map(backend.ping, [host] * probes))
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(d.size_diff for d in after.compare_to(before, 'filename') if d.size_diff > 0)
+    ok = sum(1 for r in results if r.result == 0)
+    return elapsed, allocated, ok
+
+
+def bench_contexts(args):
+    print(f"{'backend':<10} {'reuse':<6} {'probes':>7} {'ok':>7} {'us/probe':>9} {'opened':>7} {'closed':>7} {'alloc KiB':>10}")
+
+    for reuse in (False, True):
+        CountingContext.opened = CountingContext.closed = 0
+        backend = FakeBackend(reuse_contexts=reuse)
+        elapsed, allocated, ok = _run_probes(backend, "192.0.2.1", args.probes, args.workers)
+        backend.close()
+        print(f"{'fake':<10} {str(reuse):<6} {args.probes:>7} {ok:>7} {elapsed / args.probes * 1e6:>9.1f} "
+              f"{CountingContext.opened:>7} {CountingContext.closed:>7} {allocated / 1024:>10.1f}")
+
+    if args.real:
+        # Against loopback: every context costs a socket()/close() pair
+        for reuse in (False, True):
+            backend = ding.LinuxIcmpBackend(reuse_contexts=reuse)
+            opened = args.probes if not reuse else None
+            elapsed, allocated, ok = _run_probes(backend, args.host, args.probes, args.workers)
+            if opened is None:
+                opened = backend.pool.created
+            backend.close()
+            print(f"{'linux':<10} {str(reuse):<6} {args.probes:>7} {ok:>7} {elapsed / args.probes * 1e6:>9.1f} "
+                  f"{opened:>7} {opened:>7} {allocated / 1024:>10.1f}")
+
+
+# --- Terminal rendering ---
+def simulated_frames(num_hosts, seconds, frame_interval=0.15, ping_interval=1.0, seed=1):
+    """Compact-view frames for num_hosts receiving one random reply per ping_interval."""
+    rng = random.Random(seed)
+    table = ding.HostTable()
+    now = 0.0
+    for i in range(num_hosts):
+        state = table.add(f"10.0.{i // 256}.{i % 256}", now)
+        state.next_ping_time = rng.random() * ping_interval
+
+    frames = []
+    while now < seconds:
+        now += frame_interval
+        for state in table:
+            if state.next_ping_time <= now:
+                if rng.random() < 0.02:
+                    result = ding.Ping_result(1, None, state.host)
+                else:
+                    result = ding.Ping_result(0, round(rng.lognormvariate(3.0, 0.6), 3), state.host)
+                state.apply_result(result, now)
+                state.next_ping_time += ping_interval
+        frames.append(ding.build_compact_view(table, 0, False, ping_interval, None))
+    return frames
+
+
+def bench_render(args):
+    frames = simulated_frames(args.hosts, args.seconds)
+
+    full = sum(len(("\033[H\033[J" + f).encode("utf-8")) for f in frames)
+
+    renderer = ding.TerminalRenderer(io.StringIO())
+    start = time.perf_counter()
+    for frame in frames:
+        renderer.render(frame)
+    diff_cpu = time.perf_counter() - start
+
+    idle = ding.TerminalRenderer(io.StringIO())
+    idle.render(frames[-1])
+    idle_before = idle.bytes_written
+    for _ in range(100):
+        idle.render(frames[-1])
+
+    print(f"{args.hosts} hosts, {len(frames)} frames over {args.seconds:.0f}s")
+    print(f"{'renderer':<10} {'bytes/s':>12} {'frames written':>15}")
+    print(f"{'full':<10} {full / args.seconds:>12.0f} {len(frames):>15}")
+    print(f"{'diff':<10} {renderer.bytes_written / args.seconds:>12.0f} {renderer.frames_written:>15}")
+    print(f"diff cost {diff_cpu / len(frames) * 1e3:.2f} ms/frame; "
+          f"unchanged frames wrote {idle.bytes_written - idle_before} bytes")
+
+
+# --- Latency bars ---
+def reference_latency_bar(history, width=ding.SPARKLINE_WIDTH):
+    """The uncached renderer: a colour computation and an f-string per sample, every frame."""
+    if not history:
+        return " " * width
+    out = []
+    for latency in history.latencies(width):
+        if latency is None:
+            out.append("\033[48;5;196mx\033[0m")
+        else:
+            out.append(f"{ding.latency_to_bg_color(latency)} \033[0m")
+    return " " * (width - len(out)) + "".join(out)
+
+
+def bench_bars(args):
+    rng = random.Random(args.seed)
+
+    def sample(history):
+        if rng.random() < 0.02:
+            history.append(1, None)
+        else:
+            history.append(0, round(rng.lognormvariate(4.0, 0.8), 3))
+
+    histories = [ding.LatencyHistory() for _ in range(args.hosts)]
+    for history in histories:
+        for _ in range(rng.randint(0, ding.HISTORY_SIZE)):
+            sample(history)
+    # Hosts probed once per --interval get a new sample in this share of frames
+    fresh = max(1, round(args.hosts * args.frame_interval / args.interval))
+
+    def timed(render, new_samples):
+        total = 0.0
+        for _ in range(args.frames):
+            if new_samples:
+                for history in rng.sample(histories, fresh):
+                    sample(history)
+            start = time.perf_counter()
+            render()
+            total += time.perf_counter() - start
+        return total / args.frames
+
+    def cached():
+        return [ding.render_latency_bar(h) for h in histories]
+
+    def cold():
+        for history in histories:
+            history.rendered = None
+        cached()
+
+    rows = [("reference", timed(lambda: [reference_latency_bar(h) for h in histories], True))]
+    rows.append(("cached, cold", timed(cold, False)))
+    rows.append(("cached", timed(cached, True)))
+    rows.append(("no changes", timed(cached, False)))
+
+    for history, bar in zip(histories, cached()):
+        assert bar == reference_latency_bar(history), "cached bar differs from the reference"
+
+    print(f"{args.hosts} hosts, {ding.SPARKLINE_WIDTH}-sample bars, {fresh} new samples per frame, "
+          f"{args.frames} frames")
+    print(f"{'path':<14} {'us/frame':>10} {'us/host':>8} {'speedup':>8}")
+    base = rows[0][1]
+    for name, per_frame in rows:
+        print(f"{name:<14} {per_frame * 1e6:>10.0f} {per_frame / args.hosts * 1e6:>8.2f} {base / per_frame:>7.1f}x")
+    print("(cold includes dropping every cache first)")
+
+
+# --- Simulated network (scheduler + state machine + renderer) ---
+class NetworkModel:
+    """
+    Deterministic stand-in for the network. Every outcome is a hash of
+    (seed, host, probe number), so runs repeat exactly whatever order the
+    scheduler sends probes in, and no per-host RNG state is kept.
+
+    RTTs are log-normal around `rtt_ms`; `loss` is the chance a probe gets
+    no reply; `outage_hosts` of the hosts go dark for `outage_length`
+    seconds out of every `outage_period`.
+    """
+
+    def __init__(self, rtt_ms=20.0, rtt_sigma=0.5, loss=0.01,
+                 outage_hosts=0.05, outage_period=60.0, outage_length=15.0, seed=1):
+        self.mu = math.log(rtt_ms)
+        self.sigma = rtt_sigma
+        self.loss = loss
+        self.outage_hosts = outage_hosts
+        self.outage_period = outage_period
+        self.outage_length = outage_length
+        self.seed = seed
+        self._normal = statistics.NormalDist()
+
+    def _uniform(self, *key):
+        return (zlib.crc32(repr((self.seed,) + key).encode()) + 0.5) / 2 ** 32
+
+    def in_outage(self, host, t):
+        if self._uniform(host, 'outage') >= self.outage_hosts:
+            return False
+        phase = self._uniform(host, 'phase') * self.outage_period
+        return (t + phase) % self.outage_period < self.outage_length
+
+    def rtt(self, host, n, t):
+        """RTT in ms of probe n sent at t, or None if it is lost."""
+        if self.in_outage(host, t) or self._uniform(host, n, 'loss') < self.loss:
+            return None
+        z = self._normal.inv_cdf(self._uniform(host, n, 'rtt'))
+        return math.exp(self.mu + self.sigma * z)
+
+
+class SimulatedEngine:
+    """
+    Probe engine answering from a NetworkModel on a virtual clock: replies
+    (or timeouts) are delivered by advance(now), so an hour of probing runs
+    as fast as the scheduler and state machine can go.
+    """
+    name = "simulated"
+
+    def __init__(self, model):
+        self.model = model
+        self.now = 0.0
+        self.sent = 0
+        self._counts = collections.Counter()
+        self._due = []  # heap of (time, seq, future, result)
+        self._seq = itertools.count()
+
+    def submit(self, host, options=None):
+        options = options or ding.probe_defaults
+        fut = Future()
+        n = self._counts[host]
+        self._counts[host] = n + 1
+        self.sent += 1
+        rtt = self.model.rtt(host, n, self.now)
+        if rtt is None or rtt >= options.timeout_ms:
+            due, result = self.now + options.timeout_ms / 1000.0, ding.Ping_result(1, None, host)
+        else:
+            due, result = self.now + rtt / 1000.0, ding.Ping_result(0, int(rtt), host)
+        heapq.heappush(self._due, (due, next(self._seq), fut, result))
+        return fut
+
+    def advance(self, now):
+        self.now = now
+        due = self._due
+        while due and due[0][0] <= now:
+            _t, _seq, fut, result = heapq.heappop(due)
+            if not fut.cancelled():
+                fut.set_result(result)
+
+    def close(self):
+        pass
+
+
+SIM_START = 1.7e9  # fixed virtual start time, so runs repeat exactly
+
+
+def _sim_host(i):
+    return f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+
+
+def host_footprint(num_hosts, interval=1.0):
+    """Bytes per host of HostTable + scheduler state once every host has a sample."""
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    now = time.time()
+    table = ding.HostTable()
+    scheduler = ding.ProbeScheduler(table, SimulatedEngine(NetworkModel()), interval)
+    for i in range(num_hosts):
+        host = _sim_host(i)
+        table.add(host, now)
+        scheduler.add(host, now)
+        table.apply_result(host, ding.Ping_result(0, 20, host), now)
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return used / num_hosts
+
+
+def run_simulation(num_hosts, seconds, model, interval=1.0, step=0.01, frame_interval=0.15, rows=50):
+    """
+    Drive ProbeScheduler, HostTable (warm-up, UP/DOWN thresholds) and
+    TerminalRenderer for `seconds` of virtual time. Returns a dict of
+    measurements.
+    """
+    start = SIM_START
+    table = ding.HostTable()
+    engine = SimulatedEngine(model)
+    engine.now = start
+    scheduler = ding.ProbeScheduler(table, engine, interval)
+    scheduler.wheel = ding.TimerWheel(start=start)
+    for i in range(num_hosts):
+        host = _sim_host(i)
+        table.add(host, start)
+        scheduler.add(host, start)
+
+    renderer = ding.TerminalRenderer(io.StringIO())
+    frame_times = []
+    results = transitions = 0
+    next_frame = start
+    cpu0 = time.process_time()
+    wall0 = time.perf_counter()
+    for k in range(1, int(seconds / step) + 1):
+        now = start + k * step
+        scheduler.schedule_due(now)
+        engine.advance(now)
+        for host, response in scheduler.collect(now):
+            old_state, new_state = table.apply_result(host, response, now)
+            results += 1
+            if old_state is not None and new_state != old_state:
+                transitions += 1
+        if now >= next_frame:
+            next_frame += frame_interval
+            t0 = time.perf_counter()
+            renderer.render(ding.build_compact_view(table, 0, False, interval, None, 0, rows))
+            frame_times.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - wall0
+    cpu = time.process_time() - cpu0
+
+    frame_times.sort()
+    return {
+        'hosts': num_hosts,
+        'sim_seconds': seconds,
+        'probes': engine.sent,
+        'results': results,
+        'transitions': transitions,
+        'down_at_end': sum(1 for s in table if s.current_state == "down"),
+        'probes_per_sec': engine.sent / wall,
+        'cpu_us_per_probe': cpu / max(1, engine.sent) * 1e6,
+        'frame_ms_mean': statistics.fmean(frame_times) * 1e3,
+        'frame_ms_p95': frame_times[int(len(frame_times) * 0.95)] * 1e3,
+        'realtime_factor': seconds / wall,
+    }
+
+
+def bench_sim(args):
+    model = NetworkModel(args.rtt, args.rtt_sigma, args.loss, args.outage_hosts,
+                         args.outage_period, args.outage_length, args.seed)
+    rows = []
+    for n in args.hosts:
+        row = run_simulation(n, args.seconds, model, args.interval)
+        row['bytes_per_host'] = host_footprint(n, args.interval)
+        rows.append(row)
+        if not args.json:
+            if len(rows) == 1:
+                print(f"{'hosts':>7} {'probes':>9} {'probes/s':>10} {'cpu us/probe':>12} {'B/host':>8} "
+                      f"{'frame ms':>9} {'p95 ms':>7} {'changes':>8} {'x realtime':>10}")
+            print(f"{n:>7} {row['probes']:>9} {row['probes_per_sec']:>10.0f} {row['cpu_us_per_probe']:>12.1f} "
+                  f"{row['bytes_per_host']:>8.0f} {row['frame_ms_mean']:>9.2f} {row['frame_ms_p95']:>7.2f} "
+                  f"{row['transitions']:>8} {row['realtime_factor']:>10.1f}")
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+
+
+# --- Startup time ---
+# Each sample is a fresh interpreter, so nothing is cached between runs except
+# the OS page cache and ding's .pyc (written once up front).
+STARTUP_HEAVY_MODULES = (
+    'argparse', 'asyncio', 'concurrent.futures.thread', 'csv', 'ctypes', 'http.server',
+    'multiprocessing', 'platform', 'subprocess', 'urllib.request', 'yaml',
+)
+
+STARTUP_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import ding
+t1 = time.perf_counter()
+result = None
+if len(sys.argv) > 1:
+    engine = ding.make_engine(sys.argv[2], 1)
+    result = engine.submit(sys.argv[1]).result()
+    engine.close()
+t2 = time.perf_counter()
+heavy = [m for m in json.loads(sys.stdin.read()) if m in sys.modules]
+print(json.dumps({'import': t1 - t0, 'first_probe': t2 - t0,
+                  'result': result and result.result, 'heavy': heavy}))
+"""
+
+
+STARTUP_DIR = os.path.dirname(os.path.abspath(ding.__file__))
+
+
+def _startup_sample(host, engine):
+    argv = [sys.executable, "-c", STARTUP_PROBE] + ([host, engine] if host else [])
+    started = time.perf_counter()
+    out = subprocess.run(argv, input=json.dumps(STARTUP_HEAVY_MODULES), capture_output=True,
+                         text=True, check=True, cwd=STARTUP_DIR)
+    row = json.loads(out.stdout)
+    row['process'] = time.perf_counter() - started
+    return row
+
+
+def bench_startup(args):
+    # A stale or missing .pyc would add the compile time of ding.py to every sample
+    import py_compile
+    py_compile.compile(ding.__file__)
+
+    # -m rather than the script path: a script is recompiled on every run,
+    # which the frozen build never pays for
+    version = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "ding", "--version"], capture_output=True, check=True, cwd=STARTUP_DIR)
+        version.append(time.perf_counter() - started)
+    imports = [_startup_sample(None, args.engine) for _ in range(args.runs)]
+    probes = [_startup_sample(args.host, args.engine) for _ in range(args.runs)] if args.host else []
+
+    ms = lambda xs: statistics.median(xs) * 1e3
+    rows = {
+        'version_ms': ms(version),
+        'import_ms': ms([r['import'] for r in imports]),
+        'import_process_ms': ms([r['process'] for r in imports]),
+        'heavy_after_import': imports[0]['heavy'],
+    }
+    if probes:
+        rows.update({
+            'first_probe_ms': ms([r['first_probe'] for r in probes]),
+            'first_probe_process_ms': ms([r['process'] for r in probes]),
+            'first_probe_result': probes[0]['result'],
+            'heavy_after_probe': probes[0]['heavy'],
+        })
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+        return
+    print(f"median of {args.runs} runs, {sys.executable}")
+    print(f"  ding --version           {rows['version_ms']:8.1f} ms (whole process)")
+    print(f"  import ding              {rows['import_ms']:8.1f} ms ({rows['import_process_ms']:.1f} ms whole process)")
+    print(f"  heavy modules loaded     {', '.join(rows['heavy_after_import']) or '-'}")
+    if probes:
+        print(f"  import to first probe    {rows['first_probe_ms']:8.1f} ms ({rows['first_probe_process_ms']:.1f} ms whole process, "
+              f"{args.engine} engine, {args.host}, result {rows['first_probe_result']})")
+        print(f"  heavy modules loaded     {', '.join(rows['heavy_after_probe']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="bench", description="ding benchmarks")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("contexts", help="probe context reuse vs per-probe setup")
+    p.add_argument("--probes", type=int, default=20000)
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--real", action="store_true", help="also ping --host with the Linux backend (needs ICMP sockets)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.set_defaults(func=bench_contexts)
+
+    p = sub.add_parser("render", help="bytes written by the full vs diff-based renderer")
+    p.add_argument("--hosts", type=int, default=500)
+    p.add_argument("--seconds", type=float, default=30.0)
+    p.set_defaults(func=bench_render)
+
+    p = sub.add_parser("bars", help="cached latency bars vs per-sample formatting")
+    p.add_argument("--hosts", type=int, default=1000)
+    p.add_argument("--frames", type=int, default=200)
+    p.add_argument("--interval", type=float, default=1.0, help="seconds between probes to a host")
+    p.add_argument("--frame-interval", type=float, default=0.15, help="seconds between UI frames")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_bars)
+
+    p = sub.add_parser("sim", help="scheduler, state machine and renderer against a simulated network")
+    p.add_argument("--hosts", type=int, nargs="+", default=[10, 1000, 10000])
+    p.add_argument("--seconds", type=float, default=30.0, help="simulated seconds per run")
+    p.add_argument("--interval", type=float, default=1.0)
+    p.add_argument("--rtt", type=float, default=20.0, help="median RTT in ms")
+    p.add_argument("--rtt-sigma", type=float, default=0.5, help="log-normal spread of the RTT")
+    p.add_argument("--loss", type=float, default=0.01, help="probability a probe is lost")
+    p.add_argument("--outage-hosts", type=float, default=0.05, help="fraction of hosts that have outages")
+    p.add_argument("--outage-period", type=float, default=60.0)
+    p.add_argument("--outage-length", type=float, default=15.0)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true", help="print the results as JSON (for CI comparisons)")
+    p.set_defaults(func=bench_sim)
+
+    p = sub.add_parser("startup", help="import time and import-to-first-probe latency")
+    p.add_argument("--runs", type=int, default=10)
+    p.add_argument("--host", default="127.0.0.1", help="host for the first probe; empty to skip it")
+    p.add_argument("--engine", choices=["auto", "mux", "threads"], default="auto")
+    p.add_argument("--json", action="store_true", help="print the results as JSON (for CI comparisons)")
+    p.set_defaults(func=bench_startup)
+
+    args = parser.parse_args(sys.argv[1:])
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,21 +6,33 @@ Updated to add compact view with per-host notification modes
 """
 __version__ = "0.0.3"
 
-import platform
+# Only what every mode needs is imported here. Platform modules (ctypes,
+# msvcrt, winreg, termios), the UI helpers, thread/process pools, asyncio
+# and the optional features (exporter, webhooks, config parsers) are
+# imported where they are used, so `import ding` and one-shot runs start
+# quickly. `python bench.py startup` measures it.
 import os
 import sys
+import errno
 import logging
 import time
-import argparse
-import traceback
-import msvcrt
-import ctypes
-import winreg
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, InvalidStateError
 import socket
 import struct
-import ctypes.wintypes as wintypes
 import threading
+import select
+import selectors
+import itertools
+import heapq
+import collections
+import zlib
+import math
+import queue
+import json
+import io
+import mmap
+import bisect
+from array import array
 
 DOWN_THRESHOLD = 3   # failures in a row → DOWN
 UP_THRESHOLD = 2     # successes in a row → UP
@@ -30,19 +42,23 @@ MIN_PING_INTERVAL = 0.2
 MAX_PING_INTERVAL = 10.0
 WARMUP_PINGS = 6
 
+# Probe pacing
+BACKOFF_AFTER = DOWN_THRESHOLD  # consecutive failures before a host is probed less often
+BACKOFF_MAX_FACTOR = 8          # cap on the interval multiplier for failing hosts
+PHASE_STEP = (math.sqrt(5) - 1) / 2  # golden ratio: spreads hosts' phases evenly
+
 SPARKLINE_WIDTH = 12
+HISTORY_SIZE = 100       # samples kept per host
 HIGH_LATENCY_MS = 500
 
 SPARK_CHARS = "▁▂▃▄▅▆▇█"
 SPARK_FAIL_CHAR = "×"
 
-# Load iphlpapi
-iphlpapi = ctypes.WinDLL('iphlpapi')
-kernel32 = ctypes.WinDLL('kernel32')
+PING_TIMEOUT_MS = 2000
 
-if os.name == "nt":
-    kernel32 = ctypes.windll.kernel32
-    kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
+DNS_TTL = 300.0          # seconds a resolved address is trusted
+DNS_NEGATIVE_TTL = 30.0  # seconds a failed lookup is remembered
+PING_PAYLOAD = b'1234567890ABCDEF'
 
 # --- small helper banner (unchanged) ---
 ding_banner = """
@@ -59,11 +75,13 @@ Ping utility with sound notifications.
 🔔🔔🔔 Version: {__version__} 🔔🔔🔔
 -----------------------------------------
 """
-operatingSystem = platform.system().lower()
+operatingSystem = "windows" if os.name == "nt" else os.uname().sysname.lower()
 
 # --- Terminal resize utilities (unchanged) ---
 def resize_terminal(width, height):
     """Resize the Windows terminal window."""
+    import ctypes
+    import ctypes.wintypes as wintypes
     kernel32 = ctypes.windll.kernel32
     handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE = -11
 
@@ -116,29 +134,59 @@ def latency_to_bg_color(latency_ms):
     return f"\033[48;5;{color}m"
 
 
-def render_latency_bar(results, width=SPARKLINE_WIDTH):
-    """
-    Render latency history using background-colored spaces.
-    """
-    if not results:
-        return " " * width
+# Bar cells for the distinct colours of latency_to_bg_color and the exact
+# latencies where each one starts, so a frame is a bisect per sample and one
+# join per host instead of a colour computation and an f-string per sample.
+# A sample v is drawn with BAR_CELLS[bisect_right(BAR_EDGES, v)]; above
+# 350 ms latency_to_bg_color is solid red, so the last cell covers the rest.
+def _latency_bar_bands(limit=351):
+    colors = [latency_to_bg_color(0)]
+    edges = []
+    for ms in range(limit):
+        lo, hi = float(ms), float(ms + 1)
+        color = latency_to_bg_color(hi)
+        if color == colors[-1]:
+            continue
+        # Narrow down to the first float drawn in the new colour
+        while math.nextafter(lo, hi) < hi:
+            mid = (lo + hi) / 2
+            if latency_to_bg_color(mid) == colors[-1]:
+                lo = mid
+            else:
+                hi = mid
+        edges.append(hi)
+        colors.append(color)
+    return tuple(edges), tuple(f"{color} \033[0m" for color in colors)
 
-    recent = results[-width:]
-    out = []
 
-    for r in recent:
-        if r.latency is None:
-            # timeout
-            out.append("\033[48;5;196mx\033[0m")
-        else:
-            bg = latency_to_bg_color(r.latency)
-            out.append(f"{bg} \033[0m")
+BAR_FAIL_CELL = "\033[48;5;196mx\033[0m"
+BAR_EDGES, BAR_CELLS = _latency_bar_bands()
 
-    # Pad left if needed
-    if len(out) < width:
-        out = [" "] * (width - len(out)) + out
 
-    return "".join(out)
+def _build_latency_bar(history, width):
+    statuses, latencies = history.window(width)
+    cells, edges, band = BAR_CELLS, BAR_EDGES, bisect.bisect_right
+    out = [
+        BAR_FAIL_CELL if status or v != v else cells[band(edges, v)]
+        for status, v in zip(statuses, latencies)
+    ]
+    return " " * (width - len(out)) + "".join(out)
+
+
+def render_latency_bar(history, width=SPARKLINE_WIDTH):
+    """
+    Render latency history using background-colored spaces. The string is
+    cached on the history until its next sample.
+    """
+    if not history:
+        return " " * width
+    cache = history.rendered
+    if cache is None:
+        cache = history.rendered = {}
+    bar = cache.get(width)
+    if bar is None:
+        bar = cache[width] = _build_latency_bar(history, width)
+    return bar
 
 
 def choose_optimal_terminal_size(num_hosts, min_panel_width=24, base_height=20):
@@ -166,82 +214,320 @@ def choose_optimal_terminal_size(num_hosts, min_panel_width=24, base_height=20):
     return width, height
 
 
-# Helper to format Windows error codes
-def _format_win_error(err):
-    buf = ctypes.create_unicode_buffer(512)
-    kernel32.FormatMessageW(
-        0x00001000,  # FORMAT_MESSAGE_FROM_SYSTEM
-        None,
-        err,
-        0,
-        buf,
-        len(buf),
-        None
-    )
-    return buf.value.strip()
-
-# Structures for ICMP
-class IP_OPTION_INFORMATION(ctypes.Structure):
-    _fields_ = [
-        ("Ttl", ctypes.c_ubyte),
-        ("Tos", ctypes.c_ubyte),
-        ("Flags", ctypes.c_ubyte),
-        ("OptionsSize", ctypes.c_ubyte),
-        ("OptionsData", ctypes.c_void_p)
-    ]
+# --- Windows ICMP API ---
+# iphlpapi's Icmp* functions and structures are bound on first use (the
+# first WindowsProbeContext), so importing ding, or running it anywhere
+# else, never loads ctypes.
+class WindowsIcmpApi:
+    def __init__(self):
+        import ctypes
+        import ctypes.wintypes as wintypes
+        self.ctypes = ctypes
+
+        class IP_OPTION_INFORMATION(ctypes.Structure):
+            _fields_ = [
+                ("Ttl", ctypes.c_ubyte),
+                ("Tos", ctypes.c_ubyte),
+                ("Flags", ctypes.c_ubyte),
+                ("OptionsSize", ctypes.c_ubyte),
+                ("OptionsData", ctypes.c_void_p)
+            ]
+
+        class ICMP_ECHO_REPLY(ctypes.Structure):
+            _fields_ = [
+                ("Address", ctypes.c_uint32),
+                ("Status", ctypes.c_uint32),
+                ("RoundTripTime", ctypes.c_uint32),
+                ("DataSize", ctypes.c_ushort),
+                ("Reserved", ctypes.c_ushort),
+                ("Data", ctypes.c_void_p),
+                ("Options", IP_OPTION_INFORMATION)
+            ]
+
+        self.IP_OPTION_INFORMATION = IP_OPTION_INFORMATION
+        self.ICMP_ECHO_REPLY = ICMP_ECHO_REPLY
+        self.INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+        self.kernel32 = ctypes.windll.kernel32
+
+        # Icmp* prototypes
+        iphlpapi = ctypes.WinDLL('iphlpapi')
+        self.IcmpCreateFile = iphlpapi.IcmpCreateFile
+        self.IcmpCreateFile.restype = wintypes.HANDLE
+        self.IcmpCreateFile.argtypes = []
+
+        self.IcmpCloseHandle = iphlpapi.IcmpCloseHandle
+        self.IcmpCloseHandle.restype = wintypes.BOOL
+        self.IcmpCloseHandle.argtypes = [wintypes.HANDLE]
+
+        self.IcmpSendEcho2 = iphlpapi.IcmpSendEcho2
+        self.IcmpSendEcho2.restype = wintypes.DWORD
+        self.IcmpSendEcho2.argtypes = [
+            wintypes.HANDLE,     # IcmpHandle
+            wintypes.HANDLE,     # Event (can be NULL)
+            ctypes.c_void_p,     # ApcRoutine (can be NULL)
+            ctypes.c_void_p,     # ApcContext (can be NULL)
+            wintypes.DWORD,      # DestinationAddress
+            ctypes.c_void_p,     # RequestData pointer
+            wintypes.WORD,       # RequestSize
+            ctypes.POINTER(IP_OPTION_INFORMATION),  # RequestOptions
+            ctypes.c_void_p,     # ReplyBuffer pointer
+            wintypes.DWORD,      # ReplySize
+            wintypes.DWORD       # Timeout
+        ]
+
+    def format_error(self, err):
+        """Text of a Windows error code."""
+        buf = self.ctypes.create_unicode_buffer(512)
+        self.kernel32.FormatMessageW(
+            0x00001000,  # FORMAT_MESSAGE_FROM_SYSTEM
+            None,
+            err,
+            0,
+            buf,
+            len(buf),
+            None
+        )
+        return buf.value.strip()
 
-class ICMP_ECHO_REPLY(ctypes.Structure):
-    _fields_ = [
-        ("Address", ctypes.c_uint32),
-        ("Status", ctypes.c_uint32),
-        ("RoundTripTime", ctypes.c_uint32),
-        ("DataSize", ctypes.c_ushort),
-        ("Reserved", ctypes.c_ushort),
-        ("Data", ctypes.c_void_p),
-        ("Options", IP_OPTION_INFORMATION)
-    ]
 
-# Icmp* prototypes
-IcmpCreateFile = iphlpapi.IcmpCreateFile
-IcmpCreateFile.restype = wintypes.HANDLE
-IcmpCreateFile.argtypes = []
-
-IcmpCloseHandle = iphlpapi.IcmpCloseHandle
-IcmpCloseHandle.restype = wintypes.BOOL
-IcmpCloseHandle.argtypes = [wintypes.HANDLE]
-
-IcmpSendEcho2 = iphlpapi.IcmpSendEcho2
-IcmpSendEcho2.restype = wintypes.DWORD
-IcmpSendEcho2.argtypes = [
-    wintypes.HANDLE,     # IcmpHandle
-    wintypes.HANDLE,     # Event (can be NULL)
-    ctypes.c_void_p,     # ApcRoutine (can be NULL)
-    ctypes.c_void_p,     # ApcContext (can be NULL)
-    wintypes.DWORD,      # DestinationAddress
-    ctypes.c_void_p,     # RequestData pointer
-    wintypes.WORD,       # RequestSize
-    ctypes.POINTER(IP_OPTION_INFORMATION),  # RequestOptions
-    ctypes.c_void_p,     # ReplyBuffer pointer
-    wintypes.DWORD,      # ReplySize
-    wintypes.DWORD       # Timeout
-]
+_icmp_api = None
+_icmp_api_lock = threading.Lock()
+
+def icmp_api():
+    """The shared WindowsIcmpApi, bound on first call."""
+    global _icmp_api
+    if _icmp_api is None:
+        with _icmp_api_lock:
+            if _icmp_api is None:
+                _icmp_api = WindowsIcmpApi()
+    return _icmp_api
 
 
 class Ping_result:
-    def __init__(self, result, latency, host):
+    __slots__ = ('result', 'latency', 'host', 'ip', 'resolve_ms')
+
+    def __init__(self, result, latency, host, ip=None, resolve_ms=None):
         self.result = result
         self.latency = latency
         self.host = host  # Track host for multi-host output
+        self.ip = ip
+        self.resolve_ms = resolve_ms  # DNS time, kept out of latency
+
+class LatencyHistory:
+    """
+    Fixed-capacity ring buffer of probe outcomes: an array('f') of latencies
+    and a status byte (Ping_result.result) per sample. Appending never
+    allocates, so memory per host stays constant whatever the depth.
+    `rendered` caches the UI's strings for the current samples (bars by
+    width, sparklines by ('spark', width), the loss/jitter/p95 columns by
+    'stats') and is dropped on every change.
+    """
+    __slots__ = ('capacity', '_latency', '_status', '_head', '_len', 'rendered')
+
+    def __init__(self, capacity=HISTORY_SIZE):
+        self.capacity = capacity
+        self._latency = array('f', bytes(4 * capacity))
+        self._status = bytearray(capacity)
+        self._head = 0  # next slot to write
+        self._len = 0
+        self.rendered = None
+
+    def __len__(self):
+        return self._len
+
+    def append(self, result, latency):
+        i = self._head
+        self._status[i] = result
+        self._latency[i] = latency if latency is not None else math.nan
+        self._head = (i + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+        self.rendered = None
+
+    def window(self, n=None):
+        """(statuses, latencies) of the last n samples, oldest first, as bytearray/array slices."""
+        n = self._len if n is None else min(n, self._len)
+        start = (self._head - n) % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            return self._status[start:end], self._latency[start:end]
+        end -= self.capacity
+        return self._status[start:] + self._status[:end], self._latency[start:] + self._latency[:end]
+
+    def latencies(self, n=None):
+        """Last n latencies, oldest first; None for failed probes."""
+        statuses, latencies = self.window(n)
+        return [None if status or v != v else v for status, v in zip(statuses, latencies)]
+
+    def statuses(self, n=None):
+        """Last n Ping_result.result codes, oldest first."""
+        return list(self.window(n)[0])
+
+    def clear(self):
+        self._head = 0
+        self._len = 0
+        self.rendered = None
+
+# --- Streaming latency statistics ---
+# Everything below is updated in O(1) per reply, so the UI and the data API
+# never rescan history.
+EWMA_ALPHA = 0.125       # weight of the newest sample (same as TCP SRTT)
+HISTOGRAM_SUB_BITS = 5   # 2**5 linear sub-buckets per power of two, ~3% error
+HISTOGRAM_UNIT = 0.1     # ms per histogram step
+HISTOGRAM_MAX_MS = 60000.0
+
+def _histogram_index(steps):
+    half = 1 << (HISTOGRAM_SUB_BITS - 1)
+    if steps < 2 * half:
+        return steps
+    shift = steps.bit_length() - HISTOGRAM_SUB_BITS
+    return 2 * half + (shift - 1) * half + ((steps >> shift) - half)
+
+def _histogram_value(index):
+    """Midpoint (in steps) of the bucket at index."""
+    half = 1 << (HISTOGRAM_SUB_BITS - 1)
+    if index < 2 * half:
+        return index
+    shift = (index - 2 * half) // half + 1
+    mantissa = (index - 2 * half) % half + half
+    return (mantissa << shift) + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram: exact below 2**HISTOGRAM_SUB_BITS steps,
+    then a fixed number of linear buckets per power of two, so the relative
+    error of a percentile is bounded no matter how many samples it holds.
+    """
+    __slots__ = ('counts', 'count')
+
+    size = _histogram_index(int(HISTOGRAM_MAX_MS / HISTOGRAM_UNIT)) + 1
+
+    def __init__(self):
+        self.counts = array('I', bytes(4 * self.size))
+        self.count = 0
+
+    def record(self, latency_ms):
+        steps = int(min(max(latency_ms, 0.0), HISTOGRAM_MAX_MS) / HISTOGRAM_UNIT)
+        self.counts[_histogram_index(steps)] += 1
+        self.count += 1
+
+    def percentile(self, q):
+        """Latency in ms at quantile q (0-100), or None without samples."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * q / 100.0))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return _histogram_value(index) * HISTOGRAM_UNIT
+        return HISTOGRAM_MAX_MS
+
+
+class LatencyStats:
+    """
+    Running RTT statistics for one host: EWMA, Welford mean/variance,
+    min/max, RFC 3550 interarrival jitter and a histogram for percentiles.
+    The histogram is allocated on the first reply.
+    """
+    __slots__ = ('count', 'ewma', 'mean', '_m2', 'min', 'max', 'jitter', '_last', 'histogram')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.ewma = None
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.jitter = 0.0
+        self._last = None
+        self.histogram = None
+
+    def add(self, latency):
+        self.count += 1
+        # Welford
+        delta = latency - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (latency - self.mean)
+
+        self.ewma = latency if self.ewma is None else self.ewma + EWMA_ALPHA * (latency - self.ewma)
+        self.min = latency if self.min is None else min(self.min, latency)
+        self.max = latency if self.max is None else max(self.max, latency)
+
+        # RFC 3550 6.4.1: J += (|D| - J) / 16, D from consecutive replies
+        if self._last is not None:
+            self.jitter += (abs(latency - self._last) - self.jitter) / 16.0
+        self._last = latency
+
+        if self.histogram is None:
+            self.histogram = LatencyHistogram()
+        self.histogram.record(latency)
+
+    def gap(self):
+        """A lost probe breaks the sequence jitter is measured over."""
+        self._last = None
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+    def percentile(self, q):
+        return self.histogram.percentile(q) if self.histogram is not None else None
 
 # --- Argument parser (unchanged) ---
 def parseArgs():
+    import argparse
     parser = argparse.ArgumentParser(
         prog="ding",
         description=ding_banner.format(__version__=__version__),
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog='Example: ding google.com,example.com or ding google.com example.com')
+
+    def positive_int(text):
+        try:
+            value = int(text)
+        except ValueError:
+            value = 0
+        if value < 1:
+            raise argparse.ArgumentTypeError(f"{text!r} is not a positive integer")
+        return value
     
-    parser.add_argument('hosts', nargs='+', help='Hosts to be pinged (space-separated or comma-separated)', metavar='<host>')
+    parser.add_argument('hosts', nargs='*', help='Hosts to be pinged (space-separated or comma-separated); CIDR blocks and ranges such as 10.1.2.1-254 are expanded', metavar='<host>')
+    parser.add_argument('-f', '--hosts-file', metavar='FILE', help="Read hosts from FILE, whitespace or comma separated ('-' for stdin)")
+    parser.add_argument('--config', metavar='FILE', help='Load hosts and per-host settings from a TOML, YAML or CSV inventory, reloaded when it changes')
+    parser.add_argument('-i', '--interval', type=float, default=DEFAULT_PING_INTERVAL, help=f'Seconds between pings to each host ({MIN_PING_INTERVAL} – {MAX_PING_INTERVAL}, default {DEFAULT_PING_INTERVAL})')
+    parser.add_argument('--timeout', type=float, default=PING_TIMEOUT_MS / 1000, metavar='SECONDS', help=f'Seconds to wait for each reply (default {PING_TIMEOUT_MS / 1000:g})')
+    parser.add_argument('--size', type=int, default=len(PING_PAYLOAD), metavar='BYTES', help=f'ICMP payload size (default {len(PING_PAYLOAD)})')
+    parser.add_argument('--ttl', type=int, metavar='N', help='IP time-to-live of the probes (default: system default)')
+    parser.add_argument('--max-pps', type=float, default=0, metavar='N', help='Cap on probes sent per second across all hosts (default: unlimited)')
+    parser.add_argument('--backoff-max', type=float, default=BACKOFF_MAX_FACTOR, metavar='X', help=f'Failing hosts are probed at up to X times the interval (default {BACKOFF_MAX_FACTOR}; 1 disables)')
+    parser.add_argument('--sweep', action='store_true', help='Ping every host --count times, print which answered and exit')
+    parser.add_argument('-c', '--count', type=int, default=1, metavar='N', help='--sweep: probes per host (default 1)')
+    parser.add_argument('--window', type=int, default=SWEEP_WINDOW, metavar='N', help=f'--sweep: probes in flight at once (default {SWEEP_WINDOW})')
+    parser.add_argument('--alive', action='store_true', help='--sweep: only print the hosts that answered')
+    parser.add_argument('--output', choices=sorted(RESULT_WRITERS), help='Headless mode: stream one record per probe as JSON Lines or CSV instead of showing the UI')
+    parser.add_argument('--output-file', metavar='PATH', help='Append --output records to PATH instead of stdout')
+    parser.add_argument('--workers', type=positive_int, default=0, metavar='N', help='Run the probe engine in N worker processes, hosts sharded between them')
+    parser.add_argument('--alert-file', action='append', metavar='PATH', help='Append state changes as JSON Lines to PATH (repeatable)')
+    parser.add_argument('--alert-syslog', action='append', metavar='HOST[:PORT]', help='Send state changes to a syslog server over UDP, or to a local socket such as /dev/log (repeatable)')
+    parser.add_argument('--alert-webhook', action='append', metavar='URL', help='POST state changes as JSON to URL (repeatable)')
+    parser.add_argument('--alert-exec', action='append', metavar='CMD', help='Run CMD with state changes as JSON Lines on stdin (repeatable)')
+    parser.add_argument('--metrics', action='store_true', help='Show the self-metrics overlay (loop phase timings, queue depth, scheduling lag, threads); toggle with m')
+    parser.add_argument('--metrics-file', metavar='PATH', help='Append a self-metrics snapshot as a JSON line to PATH every few seconds')
+    parser.add_argument('--prometheus', metavar='[HOST:]PORT', help='Serve per-host metrics for Prometheus at http://HOST:PORT/metrics')
+    parser.add_argument('--history-dir', metavar='DIR', help='Keep every probe result on disk in DIR (one append-only file per host)')
+    parser.add_argument('--engine', choices=['auto', 'threads', 'mux'], default='auto', help='Probe engine: one thread per probe or a single multiplexed ICMP socket')
+    parser.add_argument('--dns-ttl', type=float, default=DNS_TTL, help=f'Seconds to cache DNS answers (default {DNS_TTL:.0f}); failures are cached for {DNS_NEGATIVE_TTL:.0f}s')
+    parser.add_argument('--history', type=int, default=HISTORY_SIZE, help=f'Samples of history kept per host (default {HISTORY_SIZE})')
     parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], default='ERROR', help='Set the logging level')
     parser.add_argument('--version', action='version', version=f'ding {__version__}')
     argv = parser.parse_args(sys.argv[1:])
@@ -251,75 +537,631 @@ def parseArgs():
     for host in argv.hosts:
         hosts.extend(host.split(','))
     hosts = [h.strip() for h in hosts if h.strip()]
-    
-    if not hosts:
+
+    if argv.sweep and not (hosts or argv.config or argv.hosts_file) and not sys.stdin.isatty():
+        argv.hosts_file = '-'  # `... | ding --sweep`
+    if not hosts and not argv.config and not argv.hosts_file:
         parser.print_help()
         sys.exit(1)
+    if argv.sweep:
+        if argv.output:
+            parser.error("--sweep cannot be combined with --output")
+        monitoring = [name for name, value in (
+            ('--prometheus', argv.prometheus), ('--history-dir', argv.history_dir),
+            ('--metrics', argv.metrics), ('--metrics-file', argv.metrics_file),
+            ('--alert-*', argv.alert_file or argv.alert_syslog or argv.alert_webhook or argv.alert_exec),
+        ) if value]
+        if monitoring:
+            parser.error(f"--sweep cannot be combined with {', '.join(monitoring)}")
+        if argv.count < 1 or argv.window < 1:
+            parser.error("--count and --window must be at least 1")
+    else:
+        if argv.count != 1 or argv.window != SWEEP_WINDOW or argv.alive:
+            parser.error("--count, --window and --alive need --sweep")
+        if argv.hosts_file == '-' and not argv.output:
+            parser.error("--hosts-file - needs --output or --sweep (stdin is the keyboard)")
+    for host in hosts:
+        try:
+            check_target(host)
+        except ValueError as e:
+            parser.error(f"bad host range {host!r}: {e}")
+    if not MIN_PING_INTERVAL <= argv.interval <= MAX_PING_INTERVAL:
+        parser.error(f"--interval must be between {MIN_PING_INTERVAL} and {MAX_PING_INTERVAL}")
+    if not 0.01 <= argv.timeout <= 60:
+        parser.error("--timeout must be between 0.01 and 60 seconds")
+    if not 0 <= argv.size <= MAX_PAYLOAD_SIZE:
+        parser.error(f"--size must be between 0 and {MAX_PAYLOAD_SIZE}")
+    if argv.ttl is not None and not 1 <= argv.ttl <= 255:
+        parser.error("--ttl must be between 1 and 255")
+    if argv.max_pps < 0:
+        parser.error("--max-pps cannot be negative")
+    if argv.backoff_max < 1:
+        parser.error("--backoff-max must be at least 1")
+    if argv.history < 1:
+        parser.error("--history must be at least 1")
     argv.hosts = hosts
     return argv
 
 def is_admin():
+    import ctypes
     try:
         return ctypes.windll.shell32.IsUserAnAdmin()
     except (AttributeError, OSError):
         return False
 
+def relaunch_as_admin():
+    """Re-run ding elevated through the UAC prompt and exit this process."""
+    import ctypes
+    print("Requesting admin privileges...")
+    params = " ".join([f'"{arg}"' for arg in sys.argv[1:]])
+    if not getattr(sys, 'frozen', False):
+        params = f'"{sys.argv[0]}" {params}'
+    ctypes.windll.shell32.ShellExecuteW(
+        None,
+        "runas",                                # triggers UAC prompt
+        sys.executable,                         # python.exe or ding.exe
+        params,
+        None,
+        1
+    )
+    sys.exit(0)  # Exit the non-admin process
+
 def get_system_path():
+    import winreg
     with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SYSTEM\CurrentControlSet\Control\Session Manager\Environment", 0, winreg.KEY_READ) as key:
         path, _ = winreg.QueryValueEx(key, "Path")
         return path
 
+# --- Console input ---
+# The main loop speaks msvcrt (kbhit/getwch, special keys as '\xe0' + code).
+# On POSIX we put the tty in cbreak mode and translate ANSI escape sequences
+# into the same codes so the key handling stays platform independent.
+_POSIX_KEYS = {
+    '\x1b[A': 'H',  # Up
+    '\x1b[B': 'P',  # Down
+    '\x1b[D': 'K',  # Left
+    '\x1b[C': 'M',  # Right
+    '\x1b[5~': 'I', # Page up
+    '\x1b[6~': 'Q', # Page down
+    '\x1b[H': 'G',  # Home
+    '\x1b[1~': 'G',
+    '\x1b[F': 'O',  # End
+    '\x1b[4~': 'O',
+}
+_pending_keys = []
+_saved_tty = None
+
+def console_setup():
+    global _saved_tty
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)  # ANSI escapes
+        return
+    if not sys.stdin.isatty():
+        return
+    import termios
+    import tty
+    fd = sys.stdin.fileno()
+    _saved_tty = termios.tcgetattr(fd)
+    tty.setcbreak(fd)
+
+def console_restore():
+    global _saved_tty
+    if _saved_tty is not None:
+        import termios
+        termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, _saved_tty)
+        _saved_tty = None
+
+def _stdin_ready(timeout=0):
+    return bool(select.select([sys.stdin], [], [], timeout)[0])
+
+def _read_char():
+    return os.read(sys.stdin.fileno(), 1).decode('utf-8', 'replace')
+
+def kbhit():
+    if os.name == "nt":
+        import msvcrt
+        return msvcrt.kbhit()
+    if _pending_keys:
+        return True
+    return sys.stdin.isatty() and _stdin_ready()
+
+def getwch():
+    if os.name == "nt":
+        import msvcrt
+        return msvcrt.getwch()
+    if _pending_keys:
+        return _pending_keys.pop(0)
+
+    ch = _read_char()
+    if ch != '\x1b':
+        return ch
+
+    seq = ch
+    while _stdin_ready(0.01) and len(seq) < 8:
+        seq += _read_char()
+        if seq[-1].isalpha() or seq[-1] == '~':
+            break
+    code = _POSIX_KEYS.get(seq)
+    if code is None:
+        return '\x1b'
+    _pending_keys.append(code)
+    return '\xe0'
+
+def console_input():
+    """Line input with the terminal temporarily back in cooked mode."""
+    saved = _saved_tty
+    console_restore()
+    try:
+        return input()
+    finally:
+        if saved is not None:
+            console_setup()
+
 # --- Sound: simple bell, kept as-is but callable from notifier thread ---
 def playSound():
     # Keep as minimal portable console bell for now
     # If you later want to use winsound.PlaySound you can replace this function.
     print('\a\b', end='', flush=True)
 
-# --- decideModeAndPing: unchanged logic, returns Ping_result ---
-def decideModeAndPing(host='localhost'):
-    def windowsPing(host):
-        handle = None
+# --- DNS resolution cache ---
+def _is_ipv4_literal(host):
+    try:
+        socket.inet_aton(host)
+    except OSError:
+        return False
+    return host.count('.') == 3
+
+
+class _DnsEntry:
+    __slots__ = ('ip', 'expires', 'refreshing')
+
+    def __init__(self, ip, expires):
+        self.ip = ip            # None for a cached failure
+        self.expires = expires
+        self.refreshing = False
+
+
+class ResolverCache:
+    """
+    hostname -> IPv4 address cache shared by all backends and engines.
+
+    Answers are trusted for `ttl` seconds and failures (gaierror) for
+    `negative_ttl`. Once a positive entry expires the stale address keeps
+    being served while a background thread refreshes it, so after the first
+    lookup a slow resolver never shows up as ping latency. If the refresh
+    fails the stale address is kept and retried after `negative_ttl`.
+    """
+
+    def __init__(self, ttl=DNS_TTL, negative_ttl=DNS_NEGATIVE_TTL, workers=2):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._workers = workers
+        self._refresher = None
+
+    def lookup(self, host):
+        """
+        Non-blocking: return (ip, 0.0) from the cache, or None on a miss.
+        Raises socket.gaierror for a cached failure.
+        """
+        if _is_ipv4_literal(host):
+            return host, 0.0
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None:
+                return None
+            if entry.expires > now:
+                if entry.ip is None:
+                    raise socket.gaierror(socket.EAI_NONAME, f"cached lookup failure for {host}")
+                return entry.ip, 0.0
+            if entry.ip is None:
+                return None
+            refresh = not entry.refreshing
+            entry.refreshing = True
+        if refresh:
+            self._schedule_refresh(host)
+        return entry.ip, 0.0
+
+    def resolve(self, host):
+        """
+        Return (ip, resolve_ms), querying the resolver on a cache miss.
+        Raises socket.gaierror if the name does not resolve.
+        """
+        cached = self.lookup(host)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
         try:
-            # Resolve host
             ip = socket.gethostbyname(host)
-            packed = socket.inet_aton(ip)
-            ip_addr = struct.unpack("<I", packed)[0]  # little-endian DWORD for Windows
+        except socket.gaierror:
+            self._store(host, None)
+            raise
+        resolve_ms = (time.perf_counter() - start) * 1000
+        self._store(host, ip)
+        return ip, resolve_ms
+
+    def _store(self, host, ip):
+        ttl = self.ttl if ip is not None else self.negative_ttl
+        with self._lock:
+            self._entries[host] = _DnsEntry(ip, time.monotonic() + ttl)
+
+    def _schedule_refresh(self, host):
+        with self._lock:
+            if self._refresher is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._refresher = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="ding-dns")
+            refresher = self._refresher
+        try:
+            refresher.submit(self._refresh, host)
+        except RuntimeError:
+            pass  # shutting down
+
+    def _refresh(self, host):
+        try:
+            ip = socket.gethostbyname(host)
+        except socket.gaierror as e:
+            logging.warning(f"DNS refresh for {host} failed ({e}), keeping stale address")
+            with self._lock:
+                entry = self._entries.get(host)
+                if entry is not None:
+                    entry.expires = time.monotonic() + self.negative_ttl
+                    entry.refreshing = False
+            return
+        self._store(host, ip)
+
+    def forget(self, host):
+        with self._lock:
+            self._entries.pop(host, None)
+
+    def close(self):
+        if self._refresher is not None:
+            self._refresher.shutdown(wait=False, cancel_futures=True)
+
+
+dns_cache = ResolverCache()
+
+
+# --- Probe options ---
+# Timeout, payload size and TTL of a probe. Hosts without settings of their
+# own pass None and get `probe_defaults` (the command line values).
+# Instances are interned by probe_options(), so thousands of hosts with the
+# same settings share one object and one payload.
+MAX_PAYLOAD_SIZE = 65500
+
+def make_payload(size):
+    """PING_PAYLOAD repeated/truncated to `size` bytes."""
+    return (PING_PAYLOAD * (size // len(PING_PAYLOAD) + 1))[:size]
+
+
+class ProbeOptions:
+    __slots__ = ('timeout_ms', 'payload_size', 'ttl', 'payload')
+
+    def __init__(self, timeout_ms=PING_TIMEOUT_MS, payload_size=len(PING_PAYLOAD), ttl=None):
+        self.timeout_ms = timeout_ms
+        self.payload_size = payload_size
+        self.ttl = ttl  # None: the system default
+        self.payload = make_payload(payload_size)
+
+    def __reduce__(self):
+        # Unpickle (in --workers processes) through the intern table
+        return probe_options, (self.timeout_ms, self.payload_size, self.ttl)
+
+    def __repr__(self):
+        return f"ProbeOptions(timeout_ms={self.timeout_ms}, payload_size={self.payload_size}, ttl={self.ttl})"
+
+
+probe_defaults = ProbeOptions()
+_probe_options = {}
+_probe_options_lock = threading.Lock()
+
+def probe_options(timeout_ms=None, payload_size=None, ttl=None):
+    """Shared ProbeOptions; settings left as None come from probe_defaults."""
+    key = (
+        probe_defaults.timeout_ms if timeout_ms is None else timeout_ms,
+        probe_defaults.payload_size if payload_size is None else payload_size,
+        probe_defaults.ttl if ttl is None else ttl,
+    )
+    options = _probe_options.get(key)
+    if options is None:
+        with _probe_options_lock:
+            options = _probe_options.setdefault(key, ProbeOptions(*key))
+    return options
+
+def set_probe_defaults(timeout_ms=PING_TIMEOUT_MS, payload_size=len(PING_PAYLOAD), ttl=None):
+    """Set the options used for hosts without their own (from the command line)."""
+    global probe_defaults
+    probe_defaults = ProbeOptions(timeout_ms, payload_size, ttl)
+    _probe_options.clear()
+
+
+# --- Probe contexts ---
+# Everything a probe needs besides the destination (ICMP handle or socket,
+# request/reply buffers) lives in a context. Contexts are created once per
+# worker thread and reused for the lifetime of the process, so a probe costs
+# one send/receive instead of open + allocate + send + receive + close.
+class ProbeContextPool:
+    """
+    Thread-local pool of probe contexts built by `factory`. A context flagged
+    `broken` is closed and replaced on the next get().
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._contexts = []
+        self.created = 0
+
+    def get(self):
+        ctx = getattr(self._local, 'ctx', None)
+        if ctx is not None and not ctx.broken:
+            return ctx
+        if ctx is not None:
+            self.discard(ctx)
+        ctx = self._factory()
+        self._local.ctx = ctx
+        with self._lock:
+            self._contexts.append(ctx)
+            self.created += 1
+        return ctx
+
+    def discard(self, ctx):
+        with self._lock:
+            if ctx in self._contexts:
+                self._contexts.remove(ctx)
+        if getattr(self._local, 'ctx', None) is ctx:
+            self._local.ctx = None
+        ctx.close()
+
+    def __len__(self):
+        return len(self._contexts)
+
+    def close(self):
+        with self._lock:
+            contexts, self._contexts = self._contexts, []
+        for ctx in contexts:
+            try:
+                ctx.close()
+            except OSError:
+                pass
+
+
+class ProbeContext:
+    broken = False
+
+    def close(self):
+        pass
 
-            # Open ICMP handle
-            handle = IcmpCreateFile()
-            if handle == wintypes.HANDLE(-1).value or handle is None:
-                err = ctypes.GetLastError()
-                logging.error(f"IcmpCreateFile failed: {err}: {_format_win_error(err)}")
+
+class WindowsProbeContext(ProbeContext):
+    """IcmpCreateFile handle plus the request, options and reply buffers."""
+    DEFAULT_TTL = 128
+
+    def __init__(self, payload=PING_PAYLOAD):
+        self.api = api = icmp_api()
+        self.handle = api.IcmpCreateFile()
+        if self.handle == api.INVALID_HANDLE_VALUE or self.handle is None:
+            err = api.ctypes.GetLastError()
+            raise OSError(err, f"IcmpCreateFile failed: {err}: {api.format_error(err)}")
+
+        self.ip_opts = api.IP_OPTION_INFORMATION(Ttl=self.DEFAULT_TTL, Tos=0, Flags=0, OptionsSize=0, OptionsData=None)
+        self.payload = None
+        self.set_payload(payload)
+
+    def set_payload(self, payload):
+        """(Re)build the request and reply buffers for another payload size."""
+        if payload is self.payload:
+            return
+        self.payload = payload
+        ctypes = self.api.ctypes
+        # Payload (must persist during call!)
+        self.data_buf = ctypes.create_string_buffer(payload)
+        self.data_len = len(payload)
+
+        # Reply buffer: one reply structure + payload
+        self.reply_size = ctypes.sizeof(self.api.ICMP_ECHO_REPLY) + self.data_len + 8
+        self.reply_buf = ctypes.create_string_buffer(self.reply_size)
+        self.reply = self.api.ICMP_ECHO_REPLY.from_buffer(self.reply_buf)
+
+    def close(self):
+        try:
+            if self.handle:
+                self.api.IcmpCloseHandle(self.handle)
+        except (AttributeError, OSError):
+            pass
+        self.handle = None
+
+
+# ICMP wire format helpers (used by the socket based backends)
+ICMP_TYPE_ECHO_REPLY = 0
+ICMP_TYPE_ECHO_REQUEST = 8
+ICMP_SEND_RETRY = 0.002  # seconds before retrying a send the socket buffer refused
+
+def icmp_checksum(data):
+    """RFC 1071 internet checksum."""
+    if len(data) % 2:
+        data = bytes(data) + b'\x00'
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def build_echo_request(ident, seq, payload=PING_PAYLOAD):
+    header = struct.pack("!BBHHH", ICMP_TYPE_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = icmp_checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_TYPE_ECHO_REQUEST, 0, checksum, ident, seq) + payload
+
+def parse_echo_reply(packet, raw):
+    """
+    Return (ident, seq) if packet is an ICMP echo reply, else None.
+    SOCK_RAW sockets deliver the IP header too; SOCK_DGRAM ones do not.
+    """
+    if raw:
+        if not packet:
+            return None
+        packet = packet[(packet[0] & 0x0f) * 4:]
+    if len(packet) < 8:
+        return None
+    icmp_type, _code, _csum, ident, seq = struct.unpack_from("!BBHHH", packet)
+    if icmp_type != ICMP_TYPE_ECHO_REPLY:
+        return None
+    return ident, seq
+
+def open_icmp_socket():
+    """
+    Open an ICMP socket. Unprivileged SOCK_DGRAM ping sockets are preferred
+    (allowed by net.ipv4.ping_group_range); SOCK_RAW needs root/CAP_NET_RAW.
+    Returns (sock, raw).
+    """
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except OSError as e:
+        logging.debug(f"SOCK_DGRAM ICMP unavailable ({e}), falling back to SOCK_RAW")
+    return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+
+_icmp_idents = itertools.count(os.getpid())
+
+def set_socket_ttl(sock, ttl):
+    """Set the IP TTL of outgoing packets; None restores the route default."""
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, -1 if ttl is None else ttl)
+
+
+class SocketProbeContext(ProbeContext):
+    """ICMP socket, echo request template and receive buffer."""
+
+    def __init__(self, payload=PING_PAYLOAD):
+        self.sock, self.raw = open_icmp_socket()
+        self.sock.setblocking(False)
+        # Raw sockets see every reply on the box, so each context needs
+        # its own identifier (ping sockets get one from the kernel).
+        self.ident = next(_icmp_idents) & 0xffff
+        self.seq = 0
+        self.ttl = None
+        self.payload = None
+        self.set_payload(payload)
+
+    def set_payload(self, payload):
+        """Rebuild the request template (and reply buffer) for another payload."""
+        if payload is self.payload:
+            return
+        self.payload = payload
+        self.packet = bytearray(build_echo_request(self.ident, 0, payload))
+        # Room for the IP header (raw sockets) plus the echoed payload
+        self.recv_buf = bytearray(max(2048, len(payload) + 128))
+
+    def set_ttl(self, ttl):
+        if ttl != self.ttl:
+            set_socket_ttl(self.sock, ttl)
+            self.ttl = ttl
+
+    def next_packet(self):
+        self.seq = (self.seq + 1) & 0xffff
+        struct.pack_into("!HHH", self.packet, 2, 0, self.ident, self.seq)
+        struct.pack_into("!H", self.packet, 2, icmp_checksum(self.packet))
+        return self.packet
+
+    def drain(self):
+        """Drop replies left over from earlier (timed out) probes."""
+        while True:
+            try:
+                self.sock.recv_into(self.recv_buf)
+            except (BlockingIOError, InterruptedError):
+                return
+
+    def close(self):
+        self.sock.close()
+
+
+# --- Ping backends ---
+# A backend turns a hostname into a Ping_result. decideModeAndPing picks the
+# backend registered for the current OS, so new platforms only need a class
+# and an entry in PING_BACKENDS.
+class PingBackend:
+    """
+    Base backend. Subclasses implement new_context() and ping_with(); with
+    reuse_contexts=False a context is built and torn down for every probe.
+    """
+    name = "base"
+
+    def __init__(self, reuse_contexts=True):
+        self.reuse_contexts = reuse_contexts
+        self.pool = ProbeContextPool(self.new_context)
+
+    def new_context(self):
+        return ProbeContext()
+
+    def ping_with(self, ctx, host, ip, options):
+        raise NotImplementedError
+
+    def ping(self, host, options=None):
+        try:
+            ip, resolve_ms = dns_cache.resolve(host)
+        except socket.gaierror:
+            return Ping_result(2, None, host)
+        result = self._ping_ip(host, ip, options or probe_defaults)
+        result.ip = ip
+        result.resolve_ms = resolve_ms
+        return result
+
+    def _ping_ip(self, host, ip, options):
+        if self.reuse_contexts:
+            try:
+                ctx = self.pool.get()
+            except OSError as e:
+                logging.error(f"Cannot create probe context: {e}")
                 return Ping_result(2, None, host)
+            return self.ping_with(ctx, host, ip, options)
+
+        try:
+            ctx = self.new_context()
+        except OSError as e:
+            logging.error(f"Cannot create probe context: {e}")
+            return Ping_result(2, None, host)
+        try:
+            return self.ping_with(ctx, host, ip, options)
+        finally:
+            ctx.close()
+
+    def close(self):
+        self.pool.close()
 
-            # Payload (must persist during call!)
-            data = b'1234567890ABCDEF'
-            data_buf = ctypes.create_string_buffer(data)
-            data_len = len(data)
 
-            # Options
-            ip_opts = IP_OPTION_INFORMATION(Ttl=128, Tos=0, Flags=0, OptionsSize=0, OptionsData=None)
+class WindowsIcmpBackend(PingBackend):
+    """ICMP echo through IcmpSendEcho2 (iphlpapi)."""
+    name = "windows"
 
-            # Reply buffer: one reply structure + payload
-            reply_size = ctypes.sizeof(ICMP_ECHO_REPLY) + data_len + 8
-            reply_buf = ctypes.create_string_buffer(reply_size)
+    def new_context(self):
+        return WindowsProbeContext()
+
+    def ping_with(self, ctx, host, ip, options):
+        try:
+            packed = socket.inet_aton(ip)
+            ip_addr = struct.unpack("<I", packed)[0]  # little-endian DWORD for Windows
+
+            ctx.set_payload(options.payload)
+            ctx.ip_opts.Ttl = options.ttl or ctx.DEFAULT_TTL
 
             # Call synchronous IcmpSendEcho2 (Event & APC = NULL)
-            timeout_ms = 2000
-            res = IcmpSendEcho2(
-                handle,
+            timeout_ms = options.timeout_ms
+            ctypes = ctx.api.ctypes
+            res = ctx.api.IcmpSendEcho2(
+                ctx.handle,
                 None, None, None,                 # no async
                 ip_addr,
-                ctypes.byref(data_buf),
-                data_len,
-                ctypes.byref(ip_opts),
-                ctypes.byref(reply_buf),
-                reply_size,
+                ctypes.byref(ctx.data_buf),
+                ctx.data_len,
+                ctypes.byref(ctx.ip_opts),
+                ctypes.byref(ctx.reply_buf),
+                ctx.reply_size,
                 timeout_ms
             )
 
             if res > 0:
-                reply = ctypes.cast(reply_buf, ctypes.POINTER(ICMP_ECHO_REPLY))[0]
+                reply = ctx.reply
                 if reply.Status == 0:  # IP_SUCCESS
                     # convert RoundTripTime to a normal int
                     try:
@@ -333,25 +1175,1020 @@ def decideModeAndPing(host='localhost'):
             # 0 = timeout or error
             return Ping_result(1, None, host)
 
-        except socket.gaierror:
+        except Exception as e:
+            logging.exception(f"Unexpected error: {e}")
+            ctx.broken = True
             return Ping_result(2, None, host)
+
+
+class LinuxIcmpBackend(PingBackend):
+    """ICMP echo over in-process sockets, no `ping` subprocess per probe."""
+    name = "linux"
+
+    def new_context(self):
+        return SocketProbeContext()
+
+    def ping_with(self, ctx, host, ip, options):
+        try:
+            ctx.drain()
+            ctx.set_payload(options.payload)
+            ctx.set_ttl(options.ttl)
+            packet = ctx.next_packet()
+            seq = ctx.seq
+
+            sent_at = time.monotonic()
+            deadline = sent_at + options.timeout_ms / 1000.0
+            ctx.sock.sendto(packet, (ip, 0))
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return Ping_result(1, None, host)
+                readable, _, _ = select.select([ctx.sock], [], [], remaining)
+                if not readable:
+                    return Ping_result(1, None, host)
+                try:
+                    nbytes, addr = ctx.sock.recvfrom_into(ctx.recv_buf)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                reply = parse_echo_reply(memoryview(ctx.recv_buf)[:nbytes], ctx.raw)
+                if reply is None or addr[0] != ip:
+                    continue
+                ident, reply_seq = reply
+                # Ping sockets rewrite the identifier; raw sockets see every
+                # reply on the box, so only those need the ident check.
+                if reply_seq != seq or (ctx.raw and ident != ctx.ident):
+                    continue
+                rtt = round((time.monotonic() - sent_at) * 1000, 3)
+                return Ping_result(0, rtt, host)
+
         except Exception as e:
             logging.exception(f"Unexpected error: {e}")
+            ctx.broken = True
             return Ping_result(2, None, host)
-        finally:
-            try:
-                if handle:
-                    IcmpCloseHandle(handle)
-            except (AttributeError, OSError):
-                pass
 
-    if operatingSystem == 'windows':
-        return windowsPing(host)
+
+PING_BACKENDS = {
+    'windows': WindowsIcmpBackend,
+    'linux': LinuxIcmpBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Return the shared backend for this OS, or None if unsupported."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                cls = PING_BACKENDS.get(operatingSystem)
+                if cls is None:
+                    return None
+                _backend = cls()
+    return _backend
+
+# --- decideModeAndPing: returns Ping_result from the platform backend ---
+def decideModeAndPing(host='localhost', options=None):
+    backend = get_backend()
+    if backend is not None:
+        return backend.ping(host, options)
     print(f"No ping command defined for OS: {operatingSystem}")
     logging.critical(f"OS {operatingSystem} not supported in ding's ping function")
     sys.exit(1)
 
 
+# --- Probe engines ---
+# An engine accepts hosts (and optionally their ProbeOptions) and hands back
+# concurrent.futures.Future objects resolving to Ping_result, so the main
+# loop does not care whether a probe runs on a worker thread or is
+# multiplexed on a shared socket.
+class ThreadedEngine:
+    """
+    One blocking decideModeAndPing call per worker thread. Threads are
+    started as probes need them, up to `max_workers`, so the pool follows
+    the number of probes in flight rather than the host count it was
+    built for.
+    """
+    name = "threads"
+
+    def __init__(self, max_workers=8):
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, host, options=None):
+        return self._executor.submit(decideModeAndPing, host, options)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _set_future_result(fut, result):
+    # The UI may cancel a probe (edit/remove host) while it is in flight.
+    try:
+        if not fut.done():
+            fut.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class IcmpEngine:
+    """
+    Multiplexed ICMP prober. A single socket sends every echo request and one
+    selector thread matches replies by identifier/sequence, so capacity is
+    bound by packets per second instead of by the number of threads.
+    RTTs are measured from monotonic send timestamps. Probes the socket
+    buffer has no room for are queued and retried, not reported as lost.
+    """
+    name = "mux"
+
+    def __init__(self, resolver_workers=4):
+        self._sock, self._raw = open_icmp_socket()
+        self._sock.setblocking(False)
+        try:
+            # Replies for a whole burst of hosts land on this one socket
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        except OSError:
+            pass
+        self._ident = next(_icmp_idents) & 0xffff
+        self._next_seq = 0
+        self._ttl = None
+        self._recv_buf = bytearray(2048)
+
+        self._lock = threading.Lock()
+        self._pending = {}    # seq -> (host, ip, sent_at, future, resolve_ms, deadline)
+        self._deadlines = []  # heap of (deadline, token, seq)
+        self._tokens = itertools.count()
+        self._blocked = collections.deque()  # (host, ip, fut, options, resolve_ms) waiting for buffer space
+
+        # Name resolution blocks, keep it off the selector thread. The pool
+        # is only created for the first name that misses the DNS cache.
+        self._resolver = None
+        self._resolver_workers = resolver_workers
+
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._sock, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ding-icmp", daemon=True)
+        self._thread.start()
+
+    def submit(self, host, options=None):
+        fut = Future()
+        options = options or probe_defaults
+        try:
+            cached = dns_cache.lookup(host)
+        except socket.gaierror:
+            _set_future_result(fut, Ping_result(2, None, host))
+            return fut
+
+        if cached is not None:
+            self._send(host, cached[0], fut, options, cached[1])
+        else:
+            with self._lock:
+                if self._resolver is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._resolver = ThreadPoolExecutor(max_workers=self._resolver_workers)
+                resolver = self._resolver
+            resolver.submit(self._resolve_and_send, host, fut, options)
+        return fut
+
+    def _resolve_and_send(self, host, fut, options):
+        try:
+            ip, resolve_ms = dns_cache.resolve(host)
+        except socket.gaierror:
+            _set_future_result(fut, Ping_result(2, None, host))
+            return
+        self._send(host, ip, fut, options, resolve_ms)
+
+    def _alloc_seq(self):
+        # Called with the lock held; skip sequence numbers still in flight.
+        for _ in range(0x10000):
+            self._next_seq = (self._next_seq + 1) & 0xffff
+            if self._next_seq not in self._pending:
+                return self._next_seq
+        raise RuntimeError("too many ICMP probes in flight")
+
+    def _send(self, host, ip, fut, options, resolve_ms=0.0):
+        if fut.done():
+            return
+        wake = False
+        with self._lock:
+            if self._blocked:
+                # Keep the order behind probes already waiting for buffer space
+                self._blocked.append((host, ip, fut, options, resolve_ms))
+                return
+            try:
+                wake = self._transmit(host, ip, fut, options, resolve_ms)
+            except OSError:
+                self._blocked.append((host, ip, fut, options, resolve_ms))
+                wake = True  # the selector thread retries it
+        if wake:
+            try:
+                self._wake_w.send(b'\0')
+            except OSError:
+                pass
+
+    def _transmit(self, host, ip, fut, options, resolve_ms):
+        """
+        Send one probe, with the lock held. Returns True if the selector must
+        wake up for its deadline; raises OSError if the socket buffer is full.
+        """
+        try:
+            seq = self._alloc_seq()
+        except RuntimeError as e:
+            logging.error(f"{e}; dropping probe for {host}")
+            _set_future_result(fut, Ping_result(2, None, host))
+            return False
+        packet = build_echo_request(self._ident, seq, options.payload)
+        if len(packet) + 128 > len(self._recv_buf):
+            self._recv_buf = bytearray(len(packet) + 128)
+        try:
+            # One socket for every host: switch the TTL only when it differs
+            if options.ttl != self._ttl:
+                set_socket_ttl(self._sock, options.ttl)
+                self._ttl = options.ttl
+            sent_at = time.monotonic()
+            self._sock.sendto(packet, (ip, 0))
+        except OSError as e:
+            if isinstance(e, (BlockingIOError, InterruptedError)) or e.errno == errno.ENOBUFS:
+                raise  # local congestion, not loss on the remote host
+            logging.error(f"sendto {host} ({ip}) failed: {e}")
+            _set_future_result(fut, Ping_result(2, None, host))
+            return False
+        deadline = sent_at + options.timeout_ms / 1000.0
+        self._pending[seq] = (host, ip, sent_at, fut, resolve_ms, deadline)
+        # Only wake the selector when this deadline is the new earliest one
+        wake = not self._deadlines or deadline < self._deadlines[0][0]
+        heapq.heappush(self._deadlines, (deadline, next(self._tokens), seq))
+        return wake
+
+    def _send_blocked(self):
+        # Called with the lock held, from the selector thread
+        blocked = self._blocked
+        while blocked:
+            host, ip, fut, options, resolve_ms = blocked[0]
+            if not fut.done():
+                try:
+                    self._transmit(host, ip, fut, options, resolve_ms)
+                except OSError:
+                    return
+            blocked.popleft()
+
+    def _run(self):
+        while not self._closed:
+            with self._lock:
+                if self._blocked:
+                    self._send_blocked()
+                timeout = None
+                if self._deadlines:
+                    timeout = max(0.0, self._deadlines[0][0] - time.monotonic())
+                if self._blocked:
+                    timeout = ICMP_SEND_RETRY if timeout is None else min(timeout, ICMP_SEND_RETRY)
+            try:
+                events = self._selector.select(timeout)
+            except OSError:
+                if self._closed:
+                    break
+                raise
+            for key, _ in events:
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    self._read_replies()
+            self._expire(time.monotonic())
+
+    def _read_replies(self):
+        done = []
+        buf = self._recv_buf
+        while True:
+            try:
+                nbytes, addr = self._sock.recvfrom_into(buf)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                logging.error(f"ICMP receive failed: {e}")
+                break
+            received_at = time.monotonic()
+            reply = parse_echo_reply(memoryview(buf)[:nbytes], self._raw)
+            if reply is None:
+                continue
+            ident, seq = reply
+            # Ping sockets rewrite the identifier; raw sockets see every reply
+            if self._raw and ident != self._ident:
+                continue
+            with self._lock:
+                entry = self._pending.get(seq)
+                if entry is None or entry[1] != addr[0]:
+                    continue
+                del self._pending[seq]
+            host, ip, sent_at, fut, resolve_ms, _deadline = entry
+            rtt = round((received_at - sent_at) * 1000, 3)
+            done.append((fut, Ping_result(0, rtt, host, ip, resolve_ms)))
+
+        for fut, result in done:
+            _set_future_result(fut, result)
+
+    def _expire(self, now):
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _deadline, _token, seq = heapq.heappop(self._deadlines)
+                entry = self._pending.get(seq)
+                # The seq may already have been answered (and reused)
+                if entry is None or entry[5] > now:
+                    continue
+                del self._pending[seq]
+                expired.append(entry)
+
+        for host, ip, _sent_at, fut, resolve_ms, _deadline in expired:
+            _set_future_result(fut, Ping_result(1, None, host, ip, resolve_ms))
+
+    def close(self):
+        self._closed = True
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+        self._thread.join(timeout=1.0)
+        if self._resolver is not None:
+            self._resolver.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            blocked = list(self._blocked)
+            self._blocked.clear()
+        for host, _ip, _sent_at, fut, _resolve_ms, _deadline in pending:
+            _set_future_result(fut, Ping_result(2, None, host))
+        for host, _ip, fut, _options, _resolve_ms in blocked:
+            _set_future_result(fut, Ping_result(2, None, host))
+        for s in (self._sock, self._wake_r, self._wake_w):
+            try:
+                s.close()
+            except OSError:
+                pass
+        self._selector.close()
+
+
+# --- Multi-process sharding ---
+SHARD_BATCH_INTERVAL = 0.005  # seconds requests/results are held to form a batch
+
+def _shard_worker(requests, replies, engine_kind, dns_ttl, log_level):
+    """
+    Worker process: probe the hosts sent down `requests` with its own engine
+    and send (token, result, latency, ip, resolve_ms) tuples back in batches.
+    """
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s - %(levelname)s - [worker %(process)d] %(message)s",
+        filename='ding.log',
+        filemode='a'
+    )
+    dns_cache.ttl = dns_ttl
+    engine = make_engine(engine_kind, 64)
+
+    out = []
+    lock = threading.Lock()
+    wake = threading.Event()
+    stopping = threading.Event()
+
+    def done(token, fut):
+        try:
+            r = fut.result()
+        except Exception:
+            r = Ping_result(2, None, None)
+        with lock:
+            out.append((token, r.result, r.latency, r.ip, r.resolve_ms))
+        wake.set()
+
+    def sender():
+        while not stopping.is_set():
+            wake.wait()
+            time.sleep(SHARD_BATCH_INTERVAL)
+            with lock:
+                batch = out[:]
+                out.clear()
+                wake.clear()
+            if batch:
+                try:
+                    replies.send(batch)
+                except (BrokenPipeError, OSError):
+                    return
+
+    threading.Thread(target=sender, name="ding-shard-send", daemon=True).start()
+    try:
+        while True:
+            try:
+                batch = requests.recv()
+            except (EOFError, OSError):
+                break
+            if batch is None:
+                break
+            for token, host, options in batch:
+                engine.submit(host, options).add_done_callback(lambda f, t=token: done(t, f))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopping.set()
+        wake.set()
+        engine.close()
+
+
+class ShardedEngine:
+    """
+    Spreads probes over `workers` processes, each running its own engine.
+    Hosts are sharded by a stable hash, so a host always lands on the same
+    worker (and its DNS cache). Requests and results cross the process
+    boundary in batches over one-way pipes; submit() still returns a
+    concurrent.futures.Future, so the scheduler and UI are unchanged.
+    """
+    name = "sharded"
+
+    def __init__(self, workers, engine_kind='auto'):
+        import multiprocessing
+        ctx = multiprocessing.get_context('spawn')
+        self._tokens = itertools.count()
+        self._pending = {}  # token -> (future, host, worker index)
+        self._lock = threading.Lock()
+        self._batches = [[] for _ in range(workers)]
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._procs = []
+        self._requests = []
+        self._receivers = []
+        level = logging.getLogger().getEffectiveLevel()
+        for i in range(workers):
+            req_recv, req_send = ctx.Pipe(duplex=False)
+            rep_recv, rep_send = ctx.Pipe(duplex=False)
+            proc = ctx.Process(
+                target=_shard_worker,
+                args=(req_recv, rep_send, engine_kind, dns_cache.ttl, level),
+                name=f"ding-shard-{i}",
+                daemon=True,
+            )
+            proc.start()
+            req_recv.close()
+            rep_send.close()
+            self._procs.append(proc)
+            self._requests.append(req_send)
+            t = threading.Thread(target=self._receive, args=(i, rep_recv), name=f"ding-shard-recv-{i}", daemon=True)
+            t.start()
+            self._receivers.append(t)
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="ding-shard-send", daemon=True)
+        self._flusher.start()
+
+    def submit(self, host, options=None):
+        fut = Future()
+        token = next(self._tokens)
+        index = zlib.crc32(host.encode('utf-8')) % len(self._procs)
+        # Workers do not see this process's probe_defaults
+        options = options or probe_defaults
+        with self._lock:
+            self._pending[token] = (fut, host, index)
+            self._batches[index].append((token, host, options))
+        self._wake.set()
+        return fut
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait()
+            time.sleep(SHARD_BATCH_INTERVAL)
+            with self._lock:
+                batches = self._batches
+                self._batches = [[] for _ in batches]
+                self._wake.clear()
+            for index, batch in enumerate(batches):
+                if batch and not self._closed:
+                    try:
+                        self._requests[index].send(batch)
+                    except (BrokenPipeError, OSError) as e:
+                        logging.error(f"Probe worker {index} unreachable: {e}")
+                        self._fail_worker(index)
+
+    def _receive(self, index, conn):
+        while True:
+            try:
+                batch = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                entries = [(self._pending.pop(item[0], None), item) for item in batch]
+            for entry, (_token, result, latency, ip, resolve_ms) in entries:
+                if entry is not None:
+                    _set_future_result(entry[0], Ping_result(result, latency, entry[1], ip, resolve_ms))
+        if not self._closed:
+            logging.error(f"Probe worker {index} exited")
+            self._fail_worker(index)
+
+    def _fail_worker(self, index):
+        with self._lock:
+            lost = [t for t, entry in self._pending.items() if entry[2] == index]
+            entries = [self._pending.pop(t) for t in lost]
+        for fut, host, _index in entries:
+            _set_future_result(fut, Ping_result(2, None, host))
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        for conn in self._requests:
+            try:
+                conn.send(None)
+                conn.close()
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+        with self._lock:
+            entries = list(self._pending.values())
+            self._pending.clear()
+        for fut, host, _index in entries:
+            _set_future_result(fut, Ping_result(2, None, host))
+
+
+def make_engine(kind, num_hosts, workers=0):
+    """
+    Build the probe engine for --engine / --workers. 'auto' uses the
+    multiplexed socket engine where ICMP sockets can be opened and the thread
+    pool otherwise; workers > 1 runs that engine in each worker process.
+    The pool may grow to HOST_FEED_MAX_IN_FLIGHT threads even for a short
+    host list, since CIDR blocks, ranges and hosts added later are admitted
+    up to that many probes in flight.
+    """
+    if workers and workers > 1:
+        return ShardedEngine(workers, kind)
+    use_mux = kind == 'mux' or (kind == 'auto' and os.name != "nt")
+    if use_mux:
+        try:
+            return IcmpEngine()
+        except OSError as e:
+            if kind == 'mux':
+                raise
+            logging.warning(f"Multiplexed ICMP engine unavailable ({e}), using threads")
+    return ThreadedEngine(max_workers=max(HOST_FEED_MAX_IN_FLIGHT, num_hosts))
+
+
+# --- Timer wheel for next_ping_time ---
+class TimerWheel:
+    """
+    Hashed timing wheel. schedule() is O(1) and pop_due() only visits the
+    slots whose tick has elapsed since the previous call, instead of scanning
+    every host. Timers fire at most one tick late and never early.
+    """
+
+    def __init__(self, tick=0.01, slots=1024, start=None):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        if start is None:
+            start = time.time()
+        self._cursor = int(start / tick)  # last tick already processed
+        self._ready = []
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, key, when):
+        t = math.ceil(when / self.tick)
+        if t <= self._cursor:
+            self._ready.append(key)
+        else:
+            self._slots[t % len(self._slots)].append((t, key))
+        self._count += 1
+
+    def pop_due(self, now):
+        due, self._ready = self._ready, []
+        target = int(now / self.tick)
+        if target > self._cursor:
+            n = len(self._slots)
+            if target - self._cursor >= n:
+                indices = range(n)
+            else:
+                indices = (t % n for t in range(self._cursor + 1, target + 1))
+            for i in indices:
+                slot = self._slots[i]
+                if not slot:
+                    continue
+                keep = []
+                for entry in slot:
+                    if entry[0] <= target:
+                        due.append(entry[1])
+                    else:
+                        keep.append(entry)
+                self._slots[i] = keep
+            self._cursor = target
+        self._count -= len(due)
+        return due
+
+    def next_due(self):
+        """Time of the earliest pending timer, or None if the wheel is empty."""
+        if self._ready:
+            return self._cursor * self.tick
+        if not self._count:
+            return None
+        n = len(self._slots)
+        for k in range(1, n + 1):
+            t = self._cursor + k
+            for entry in self._slots[t % n]:
+                if entry[0] == t:
+                    return t * self.tick
+        # Everything is more than one revolution away
+        return min(e[0] for slot in self._slots for e in slot) * self.tick
+
+
+# --- Probe scheduling ---
+class TokenBucket:
+    """
+    Send-rate limit for --max-pps: refills `rate` tokens a second and holds
+    at most a twentieth of a second's worth (at least one). A rate of 0 or
+    None never limits. `now` can come from any clock, as long as it is
+    always the same one.
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, now):
+        self.rate = rate
+        self.burst = max(1.0, rate / 20.0) if rate else 1.0
+        self.tokens = 1.0
+        self.updated = now
+
+    def take(self, now):
+        """Use up one token if there is one."""
+        if not self.rate:
+            return True
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def next_token(self):
+        """When the next token is available."""
+        return self.updated + (1.0 - self.tokens) / self.rate
+
+
+class ProbeScheduler:
+    """
+    Keeps every host of a HostTable probed every `interval` seconds (or its
+    own HostState.interval) with at most one probe in flight per host. Due
+    hosts come off a TimerWheel and finished probes are pushed onto a
+    completion queue by the engine's future callbacks, so nothing scans all
+    hosts or polls all futures.
+
+    Pacing: each new host is probed at once and then gets a phase within
+    the interval (golden-ratio sequence) so hosts added together do not keep
+    probing in one burst; hosts keep their phase across stalls; `max_pps`
+    caps the global send rate with a token bucket, queueing the excess; and
+    hosts failing more than BACKOFF_AFTER times in a row are probed at a
+    doubling interval, up to `backoff_max` times the normal one.
+    """
+
+    def __init__(self, table, engine, interval=DEFAULT_PING_INTERVAL, max_pps=None, backoff_max=BACKOFF_MAX_FACTOR):
+        self.table = table
+        self.engine = engine
+        self.interval = interval
+        self.max_pps = max_pps
+        self.backoff_max = backoff_max
+        self.futures = {}
+        self.wheel = TimerWheel()
+        self._completed = queue.SimpleQueue()  # (host, future) pushed as probes finish
+        self._ready = []
+        self._overdue = set()
+        self._backlog = collections.deque()  # due hosts held back by max_pps
+        self._phase = 0.0
+        self._phases = {}  # host -> offset added after its first probe
+        self._bucket = TokenBucket(max_pps, time.time())
+        self.metrics = None  # LoopMetrics, when self-metrics are on
+
+    def __len__(self):
+        """Probes in flight."""
+        return len(self.futures)
+
+    def add(self, host, when):
+        """Schedule a new host's first probe at `when`; later ones are phase-shifted."""
+        self._phase = (self._phase + PHASE_STEP) % 1.0
+        stats = self.table.get(host)
+        interval = self.interval if stats is None else stats.interval or self.interval
+        self._phases[host] = self._phase * interval
+        if stats is not None:
+            stats.next_ping_time = when
+        self.wheel.schedule(host, when)
+
+    def cancel(self, host):
+        """Drop the in-flight probe of a removed or renamed host."""
+        self._overdue.discard(host)
+        self._phases.pop(host, None)
+        fut = self.futures.pop(host, None)
+        if fut:
+            try:
+                fut.cancel()
+            except Exception:
+                pass
+
+    def reschedule(self, host, now):
+        """Apply a shortened per-host interval without waiting out the old one."""
+        stats = self.table.get(host)
+        if stats is None:
+            return
+        nxt = now + self.host_interval(stats)
+        if nxt < stats.next_ping_time:
+            stats.next_ping_time = nxt
+            self.wheel.schedule(host, nxt)
+
+    def host_interval(self, stats):
+        """Interval for this host (its own or the global one), stretched while it keeps failing."""
+        interval = stats.interval or self.interval
+        failures = stats.consecutive_down - BACKOFF_AFTER
+        if failures <= 0 or self.backoff_max <= 1:
+            return interval
+        return interval * min(2 ** failures, self.backoff_max)
+
+    def _submit(self, host, options):
+        fut = self.engine.submit(host, options)
+        self.futures[host] = fut
+        fut.add_done_callback(lambda f, h=host: self._completed.put((h, f)))
+
+    def schedule_due(self, now):
+        """Submit probes for hosts whose next_ping_time has passed, within max_pps."""
+        backlog = self._backlog
+        backlog.extend(self.wheel.pop_due(now))
+        while backlog:
+            host = backlog[0]
+            stats = self.table.get(host)
+            if stats is None or now + self.wheel.tick < stats.next_ping_time:
+                backlog.popleft()
+                continue  # removed host or superseded timer
+            if host in self.futures:
+                backlog.popleft()
+                self._overdue.add(host)  # fire as soon as the probe returns
+                continue
+            if not self._bucket.take(now):
+                break
+            backlog.popleft()
+            self._submit(host, stats.options)
+            if self.metrics is not None:
+                self.metrics.probe_sent(now - stats.next_ping_time)
+            # Keep the host's phase instead of drifting by the pacing delay;
+            # after a stall, skip the missed rounds rather than realigning
+            interval = self.host_interval(stats)
+            nxt = stats.next_ping_time + interval
+            if self._phases:
+                nxt += self._phases.pop(host, 0.0)
+            if nxt <= now:
+                nxt += (math.floor((now - nxt) / interval) + 1) * interval
+            stats.next_ping_time = nxt
+            self.wheel.schedule(host, nxt)
+
+    def collect(self, now):
+        """Return [(host, Ping_result)] for probes finished since the last call."""
+        ready = self._ready
+        while True:
+            try:
+                ready.append(self._completed.get_nowait())
+            except queue.Empty:
+                break
+
+        results = []
+        for host, fut in ready:
+            if self.futures.get(host) is not fut:
+                continue  # host removed/edited while the probe was in flight
+            del self.futures[host]
+            try:
+                response = fut.result()
+            except Exception as e:
+                logging.exception(f"Ping error for {host}: {e}")
+                response = Ping_result(2, None, host)
+            results.append((host, response))
+            if host in self._overdue:
+                self._overdue.discard(host)
+                stats = self.table.get(host)
+                if stats is not None:
+                    stats.next_ping_time = now
+                self.wheel.schedule(host, now)
+        ready.clear()
+        return results
+
+    def wait(self, timeout, paused=False):
+        """Block until a probe finishes, the next probe is due, or timeout."""
+        wake_at = time.time() + timeout
+        if not paused:
+            if self._backlog:
+                wake_at = min(wake_at, self._bucket.next_token())
+            due = self.wheel.next_due()
+            if due is not None:
+                wake_at = min(wake_at, due)
+        try:
+            self._ready.append(self._completed.get(timeout=max(0.0, wake_at - time.time())))
+        except queue.Empty:
+            pass
+
+
+# --- Self metrics ---
+# Where the main loop spends its time. Everything is optional: the loop
+# and the scheduler hold `metrics = None` unless --metrics / the (m) overlay
+# is on, so when off the cost is one `is not None` test per phase.
+METRICS_WINDOW = 2.0
+LOOP_PHASES = ('schedule', 'results', 'render', 'input', 'wait')
+
+class LoopMetrics:
+    """
+    mark(phase) charges the time since the previous mark to `phase`.
+    Every `window` seconds the totals are folded into `snapshot`, a plain
+    dict for the overlay and for --metrics-file.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.snapshot = None
+        self._last = time.perf_counter()
+        self._start = self._last
+        self._reset()
+
+    def _reset(self):
+        self._time = dict.fromkeys(LOOP_PHASES, 0.0)
+        self._max = dict.fromkeys(LOOP_PHASES, 0.0)
+        self._loops = 0
+        self._sent = 0
+        self._lag_sum = 0.0
+        self._lag_max = 0.0
+        self._results = 0
+        self._resolve_sum = 0.0
+        self._resolve_max = 0.0
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        dt = now - self._last
+        self._last = now
+        self._time[phase] += dt
+        if dt > self._max[phase]:
+            self._max[phase] = dt
+
+    def probe_sent(self, lag):
+        """A probe went out `lag` seconds after its next_ping_time."""
+        self._sent += 1
+        self._lag_sum += lag
+        if lag > self._lag_max:
+            self._lag_max = lag
+
+    def result(self, response):
+        self._results += 1
+        if response.resolve_ms:
+            self._resolve_sum += response.resolve_ms
+            if response.resolve_ms > self._resolve_max:
+                self._resolve_max = response.resolve_ms
+
+    def end_loop(self, scheduler):
+        """Count one main loop pass; returns True when a new snapshot was taken."""
+        self._loops += 1
+        elapsed = self._last - self._start
+        if elapsed < self.window:
+            return False
+        self.snapshot = {
+            'timestamp': round(time.time(), 3),
+            'loops_per_sec': round(self._loops / elapsed, 1),
+            'phases_ms': {p: round(t / self._loops * 1e3, 3) for p, t in self._time.items()},
+            'phases_max_ms': {p: round(t * 1e3, 3) for p, t in self._max.items()},
+            'busy_pct': round(100.0 * (elapsed - self._time['wait']) / elapsed, 1),
+            'in_flight': len(scheduler),
+            'backlog': len(scheduler._backlog),
+            'timers': len(scheduler.wheel),
+            'probes_per_sec': round(self._sent / elapsed, 1),
+            'results_per_sec': round(self._results / elapsed, 1),
+            'lag_ms': round(self._lag_sum / self._sent * 1e3, 2) if self._sent else 0.0,
+            'lag_max_ms': round(self._lag_max * 1e3, 2),
+            'resolve_max_ms': round(self._resolve_max, 2),
+            'threads': threading.active_count(),
+        }
+        self._start = self._last
+        self._reset()
+        return True
+
+
+class MetricsExporter:
+    """Appends each LoopMetrics snapshot to a file as one JSON line."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, snapshot):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(snapshot, separators=(',', ':')) + "\n")
+        except OSError as e:
+            logging.error(f"Cannot write metrics to {self.path}: {e}")
+
+
+# --- asyncio API ---
+# For embedding ding in asyncio services. Probes run on the same engines as
+# the console UI; their futures are bridged with asyncio.wrap_future.
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+def get_shared_engine():
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = make_engine('auto', 8)
+    return _shared_engine
+
+
+async def probe(host, engine=None):
+    """Ping host once and return its Ping_result."""
+    import asyncio
+    engine = engine or get_shared_engine()
+    return await asyncio.wrap_future(engine.submit(host))
+
+
+class MonitorEvent:
+    """One processed probe as yielded by monitor()."""
+    __slots__ = ('host', 'result', 'old_state', 'new_state', 'stats')
+
+    def __init__(self, host, result, old_state, new_state, stats):
+        self.host = host
+        self.result = result
+        self.old_state = old_state
+        self.new_state = new_state
+        self.stats = stats
+
+    @property
+    def changed(self):
+        return self.new_state != self.old_state
+
+
+async def monitor(hosts, interval=DEFAULT_PING_INTERVAL, engine=None, history_size=HISTORY_SIZE):
+    """
+    Probe hosts every `interval` seconds, forever, yielding a MonitorEvent as
+    soon as each reply or timeout arrives:
+
+        async for event in monitor(["10.0.0.1", "example.com"]):
+            print(event.host, event.result.latency, event.new_state)
+
+    Warm-up and UP/DOWN thresholds behave as in the console UI.
+    """
+    import asyncio
+    engine = engine or get_shared_engine()
+    hosts = list(dict.fromkeys(hosts))
+    completed = asyncio.Queue()
+    wheel = TimerWheel()
+    in_flight = {}
+    overdue = set()
+
+    now = time.time()
+    table = HostTable(history_size)
+    for host in hosts:
+        table.add(host, now)
+        wheel.schedule(host, now)
+
+    try:
+        while True:
+            now = time.time()
+            for host in wheel.pop_due(now):
+                if host in in_flight:
+                    overdue.add(host)
+                    continue
+                fut = asyncio.wrap_future(engine.submit(host))
+                fut.add_done_callback(lambda f, h=host: completed.put_nowait((h, f)))
+                in_flight[host] = fut
+                table[host].next_ping_time = now + interval
+                wheel.schedule(host, now + interval)
+
+            due = wheel.next_due()
+            timeout = None if due is None else max(0.0, due - time.time())
+            try:
+                host, fut = await asyncio.wait_for(completed.get(), timeout)
+            except asyncio.TimeoutError:
+                continue
+
+            del in_flight[host]
+            try:
+                response = fut.result()
+            except Exception as e:
+                logging.exception(f"Ping error for {host}: {e}")
+                response = Ping_result(2, None, host)
+
+            now = time.time()
+            stats = table[host]
+            old_state, new_state = table.apply_result(host, response, now)
+            if host in overdue:
+                overdue.discard(host)
+                wheel.schedule(host, now)
+            yield MonitorEvent(host, response, old_state, new_state, stats)
+    finally:
+        for fut in in_flight.values():
+            fut.cancel()
+
+
 # --- utility helpers for display ---
 def format_duration(seconds):
     if seconds < 60:
@@ -361,37 +2198,40 @@ def format_duration(seconds):
     else:
         return f"{int(seconds // 3600)} h"
 
-def render_latency_sparkline(results, width=SPARKLINE_WIDTH):
-    """
-    Build a sparkline from recent ping results.
-    Success -> scaled block
-    Failure -> ×
-    """
-    if not results:
-        return " " * width
-
-    recent = results[-width:]
-
-    # Extract latencies (None for failures)
-    latencies = [r.latency for r in recent]
+def _build_latency_sparkline(history, width):
+    # Latencies (None for failures)
+    latencies = history.latencies(width)
 
     valid = [v for v in latencies if v is not None]
     if not valid:
         return SPARK_FAIL_CHAR * len(latencies)
 
     lo = min(valid)
-    hi = max(valid)
-    span = max(hi - lo, 1)
+    span = max(max(valid) - lo, 1)
+    steps = len(SPARK_CHARS) - 1
+    chars = SPARK_CHARS
+    return "".join(
+        SPARK_FAIL_CHAR if v is None else chars[int((v - lo) / span * steps)] for v in latencies
+    ).rjust(width)
 
-    out = []
-    for v in latencies:
-        if v is None:
-            out.append(SPARK_FAIL_CHAR)
-        else:
-            idx = int((v - lo) / span * (len(SPARK_CHARS) - 1))
-            out.append(SPARK_CHARS[idx])
 
-    return "".join(out).rjust(width)
+def render_latency_sparkline(history, width=SPARKLINE_WIDTH):
+    """
+    Build a sparkline from recent ping results.
+    Success -> scaled block
+    Failure -> ×
+    Cached on the history, next to the bar, until its next sample.
+    """
+    if not history:
+        return " " * width
+    cache = history.rendered
+    if cache is None:
+        cache = history.rendered = {}
+    key = ('spark', width)
+    spark = cache.get(key)
+    if spark is None:
+        spark = cache[key] = _build_latency_sparkline(history, width)
+    return spark
 
 
 # --- Evaluate whether a host is "alerting" according to its notify_mode ---
@@ -408,7 +2248,7 @@ def evaluate_alert(stats, new_state, old_state):
     For modes 1/2 we consider the instantaneous state (alert while in that state).
     For mode 3 (state change), set alert for ALERT_HOLD_SECONDS after a change.
     """
-    mode = stats.get('notify_mode', 3)
+    mode = stats.notify_mode
 
     # mode 0: never alert
     if mode == 0:
@@ -422,27 +2262,559 @@ def evaluate_alert(stats, new_state, old_state):
     if mode == 2:
         return new_state == "down"
 
-    # mode 3: state change -> keep alert True for ALERT_HOLD_SECONDS after change
-    if mode == 3:
-        changed = new_state != old_state
-        now_ts = time.time()
-        if changed:
-            # mark when alert started
-            stats['alert_since'] = now_ts
-            return True
+    # mode 3: state change -> keep alert True for ALERT_HOLD_SECONDS after change
+    if mode == 3:
+        changed = new_state != old_state
+        now_ts = time.time()
+        if changed:
+            # mark when alert started
+            stats.alert_since = now_ts
+            return True
+
+        alert_since = stats.alert_since
+        if alert_since is None:
+            return False
+
+        if now_ts - alert_since <= ALERT_HOLD_SECONDS:
+            return True
+
+        # clear alert_since after hold expires
+        stats.alert_since = None
+        return False
+
+    return False
+
+# --- Host state ---
+class HostState:
+    """
+    Monitoring state of one host. A __slots__ record instead of a dict keeps
+    per-host memory small and attribute access cheap in the result loop.
+    """
+    __slots__ = (
+        'host', 'sent', 'received', 'history',
+        'current_state', 'state_since', 'next_ping_time',
+        'consecutive_up', 'consecutive_down', 'warmup_left', 'warmup_done',
+        'status_msg', 'notify_mode', 'alerting', 'alert_since', 'latency',
+        'latency_stats', 'interval', 'options', 'down_threshold', 'up_threshold',
+        'groups',
+    )
+
+    def __init__(self, host, now, history_size=HISTORY_SIZE, notify_mode=3):
+        self.host = host
+        self.history = LatencyHistory(history_size)
+        self.latency_stats = LatencyStats()
+        self.next_ping_time = now
+        self.status_msg = ""
+        self.notify_mode = notify_mode
+        self.interval = None       # None: the scheduler's global interval
+        self.options = None        # ProbeOptions, None: probe_defaults
+        self.down_threshold = DOWN_THRESHOLD
+        self.up_threshold = UP_THRESHOLD
+        self.groups = ()
+        self.reset(now)
+
+    def reset(self, now):
+        """Forget statistics and start a new warm-up (the (c)lear command)."""
+        self.sent = 0
+        self.received = 0
+        self.history.clear()
+        self.latency_stats.reset()
+        self.current_state = None
+        self.state_since = now
+        self.consecutive_up = 0
+        self.consecutive_down = 0
+        self.warmup_left = WARMUP_PINGS
+        self.warmup_done = False
+        self.alerting = False
+        self.alert_since = None
+        self.latency = None
+
+    @property
+    def loss_pct(self):
+        return 100.0 * (self.sent - self.received) / self.sent if self.sent else 0.0
+
+    def summary(self):
+        """Plain dict of the host's current state and statistics."""
+        ls = self.latency_stats
+        return {
+            'host': self.host,
+            'groups': list(self.groups),
+            'state': self.current_state,
+            'state_since': self.state_since,
+            'sent': self.sent,
+            'received': self.received,
+            'loss_pct': self.loss_pct,
+            'last_ms': self.latency,
+            'ewma_ms': ls.ewma,
+            'mean_ms': ls.mean if ls.count else None,
+            'stddev_ms': ls.stddev if ls.count else None,
+            'min_ms': ls.min,
+            'max_ms': ls.max,
+            'jitter_ms': ls.jitter,
+            'p50_ms': ls.percentile(50),
+            'p95_ms': ls.percentile(95),
+            'p99_ms': ls.percentile(99),
+        }
+
+    def set_notify_mode(self, mode):
+        self.notify_mode = mode % 4
+        self.alert_since = None  # reset hold timer
+
+    def configure(self, entry):
+        """Take the settings of an inventory HostEntry; statistics are kept."""
+        self.interval = entry.interval
+        self.options = entry.probe_options()
+        self.down_threshold = entry.down_threshold or DOWN_THRESHOLD
+        self.up_threshold = entry.up_threshold or UP_THRESHOLD
+        self.groups = entry.groups
+        if entry.notify_mode is not None:
+            self.set_notify_mode(entry.notify_mode)
+
+    def apply_result(self, response, now):
+        """
+        Fold one Ping_result into the state: counters, history, warm-up,
+        UP/DOWN thresholds and alerting. Returns (old_state, new_state).
+        """
+        ok = response.result == 0
+        self.sent += 1
+        if ok:
+            self.received += 1
+        self.history.append(response.result, response.latency)
+
+        self.latency = response.latency if ok else None
+        if self.latency is not None:
+            self.latency_stats.add(self.latency)
+        else:
+            self.latency_stats.gap()
+
+        old_state = self.current_state
+
+        if ok:
+            self.consecutive_up += 1
+            self.consecutive_down = 0
+        else:
+            self.consecutive_down += 1
+            self.consecutive_up = 0
+
+        # --- Warm-up phase ---
+        if not self.warmup_done:
+            self.warmup_left -= 1
+
+            if self.warmup_left <= 0:
+                # Decide initial state by majority
+                self.current_state = "down" if self.consecutive_down >= self.consecutive_up else "up"
+                self.state_since = now
+                self.warmup_done = True
+                self.alert_since = None
+
+            # No alerts during warmup
+            self.alerting = False
+            return old_state, self.current_state
+
+        # --- Normal state transitions ---
+        new_state = old_state
+
+        if old_state == "up" and self.consecutive_down >= self.down_threshold:
+            new_state = "down"
+
+        elif old_state == "down" and self.consecutive_up >= self.up_threshold:
+            new_state = "up"
+
+        if new_state != old_state:
+            self.current_state = new_state
+            self.state_since = now
+
+        self.status_msg = f"{new_state.upper()} {format_duration(now - self.state_since)}"
+        self.alerting = evaluate_alert(self, new_state, old_state)
+        return old_state, new_state
+
+
+class HostTable:
+    """
+    Ordered table of HostState records. `order` is the display order and is
+    what the UI indexes with selected_index.
+
+    The table also keeps a running count of alerting hosts. Results and
+    resets should go through apply_result()/reset() here so the count stays
+    exact; every change is signalled on `alert_changed`. Mode 3 alerts end
+    ALERT_HOLD_SECONDS after the change even if the host's next result is
+    much later: their expiries are kept in a heap and expire_holds() (the
+    notifier, and every result) clears the ones that have run out.
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.history_size = history_size
+        self.order = []
+        self._states = {}
+        self.alerting_count = 0
+        self.alert_changed = threading.Condition()
+        self._holds = []  # heap of (expires, host, alert_since)
+
+    def _alerting_delta(self, delta):
+        with self.alert_changed:
+            self.alerting_count += delta
+            self.alert_changed.notify_all()
+
+    def apply_result(self, host, response, now):
+        """HostState.apply_result for host, keeping alerting_count in step."""
+        state = self._states[host]
+        with self.alert_changed:
+            was_alerting = state.alerting
+            held_since = state.alert_since
+            transition = state.apply_result(response, now)
+            if state.alerting and state.alert_since != held_since:
+                heapq.heappush(self._holds, (state.alert_since + ALERT_HOLD_SECONDS, host, state.alert_since))
+            if state.alerting != was_alerting:
+                self._alerting_delta(1 if state.alerting else -1)
+            if self._holds and self._holds[0][0] <= now:
+                self.expire_holds(now)
+        return transition
+
+    def expire_holds(self, now):
+        """End the mode 3 alerts whose hold has run out; returns seconds to the next expiry, or None."""
+        with self.alert_changed:
+            holds = self._holds
+            while holds and holds[0][0] <= now:
+                _, host, since = heapq.heappop(holds)
+                state = self._states.get(host)
+                if state is not None and state.alerting and state.notify_mode == 3 and state.alert_since == since:
+                    state.alerting = False
+                    state.alert_since = None
+                    self._alerting_delta(-1)
+            return holds[0][0] - now if holds else None
+
+    def reset(self, host, now):
+        state = self._states[host]
+        with self.alert_changed:
+            if state.alerting:
+                self._alerting_delta(-1)
+            state.reset(now)
+        return state
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, host):
+        return host in self._states
+
+    def __getitem__(self, host):
+        return self._states[host]
+
+    def __iter__(self):
+        """HostState records in display order."""
+        states = self._states
+        return (states[h] for h in self.order)
+
+    def get(self, host):
+        return self._states.get(host)
+
+    def slice(self, start, stop):
+        """HostState records for display positions [start, stop)."""
+        states = self._states
+        return [states[h] for h in self.order[start:stop]]
+
+    def add(self, host, now):
+        """Append a new host; returns its HostState, or None if already present."""
+        if host in self._states:
+            return None
+        state = HostState(host, now, self.history_size)
+        self._states[host] = state
+        self.order.append(host)
+        return state
+
+    def remove(self, host):
+        with self.alert_changed:
+            state = self._states.pop(host, None)
+            if state is not None and state.alerting:
+                self._alerting_delta(-1)
+        if state is not None:
+            self.order.remove(host)
+        return state
+
+    def rename(self, old_host, new_host, now):
+        """Replace old_host in place with a fresh record for new_host."""
+        if new_host in self._states:
+            return None
+        index = self.order.index(old_host)
+        with self.alert_changed:
+            if self._states.pop(old_host).alerting:
+                self._alerting_delta(-1)
+        state = HostState(new_host, now, self.history_size)
+        self._states[new_host] = state
+        self.order[index] = new_host
+        return state
+
+# --- Host inventory files ---
+# --config loads hosts and their settings from TOML, YAML or CSV:
+#
+#   [defaults]                      host,interval,notify,groups
+#   interval = 5                    10.0.0.1,0.2,down,core;dc1
+#   [[hosts]]                       10.0.0.2,,,edge
+#   host = "10.0.0.1"
+#   interval = 0.2
+#   groups = ["core"]
+#
+# Settings: interval (s), timeout (s), payload_size (bytes), ttl,
+# down_threshold, up_threshold, notify (none/up/down/change or 0-3) and
+# groups. TOML/YAML files can also give settings to a whole group in a
+# [groups.NAME] table. The file is watched and
+# a changed inventory is applied as a diff: new hosts are added, dropped
+# ones removed and edited ones reconfigured, while every other host keeps
+# its statistics and probe schedule.
+CONFIG_RELOAD_INTERVAL = 2.0
+MAX_HOST_INTERVAL = 3600.0
+CONFIG_KEYS = ('host', 'interval', 'timeout', 'payload_size', 'ttl', 'down_threshold', 'up_threshold', 'notify', 'groups')
+NOTIFY_MODE_NAMES = {'none': 0, 'never': 0, 'up': 1, 'on up': 1, 'down': 2, 'on down': 2, 'change': 3, 'on change': 3}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class HostEntry:
+    """One inventory host and its settings; None means the global default."""
+    __slots__ = ('host', 'interval', 'timeout_ms', 'payload_size', 'ttl', 'down_threshold', 'up_threshold',
+                 'notify_mode', 'groups')
+
+    def __init__(self, host, interval=None, timeout_ms=None, payload_size=None, ttl=None,
+                 down_threshold=None, up_threshold=None, notify_mode=None, groups=()):
+        self.host = host
+        self.interval = interval
+        self.timeout_ms = timeout_ms
+        self.payload_size = payload_size
+        self.ttl = ttl
+        self.down_threshold = down_threshold
+        self.up_threshold = up_threshold
+        self.notify_mode = notify_mode
+        self.groups = groups
+
+    def settings(self):
+        return (self.interval, self.timeout_ms, self.payload_size, self.ttl,
+                self.down_threshold, self.up_threshold, self.notify_mode, self.groups)
+
+    def probe_options(self):
+        """Shared ProbeOptions for this host, or None if it uses the defaults."""
+        if self.timeout_ms is None and self.payload_size is None and self.ttl is None:
+            return None
+        return probe_options(self.timeout_ms, self.payload_size, self.ttl)
+
+
+def _config_number(value, kind, name, where, low, high):
+    try:
+        number = kind(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{where}: {name} must be a number, not {value!r}") from None
+    if not low <= number <= high:
+        raise ConfigError(f"{where}: {name} must be between {low} and {high}")
+    return number
+
+
+def _host_entry(fields, where):
+    """Build a HostEntry from one record; values may be strings (CSV) or typed (TOML/YAML)."""
+    unknown = set(fields) - set(CONFIG_KEYS)
+    if unknown:
+        raise ConfigError(f"{where}: unknown setting(s) {', '.join(sorted(unknown))}")
+    host = str(fields.get('host') or '').strip()
+    if not host:
+        raise ConfigError(f"{where}: missing host")
+    entry = HostEntry(host)
+
+    def given(name):
+        value = fields.get(name)
+        return None if value is None or value == '' else value
+
+    if given('interval') is not None:
+        entry.interval = _config_number(fields['interval'], float, 'interval', where, MIN_PING_INTERVAL, MAX_HOST_INTERVAL)
+    if given('timeout') is not None:
+        entry.timeout_ms = round(_config_number(fields['timeout'], float, 'timeout', where, 0.01, 60.0) * 1000)
+    if given('payload_size') is not None:
+        entry.payload_size = _config_number(fields['payload_size'], int, 'payload_size', where, 0, MAX_PAYLOAD_SIZE)
+    if given('ttl') is not None:
+        entry.ttl = _config_number(fields['ttl'], int, 'ttl', where, 1, 255)
+    if given('down_threshold') is not None:
+        entry.down_threshold = _config_number(fields['down_threshold'], int, 'down_threshold', where, 1, 1000)
+    if given('up_threshold') is not None:
+        entry.up_threshold = _config_number(fields['up_threshold'], int, 'up_threshold', where, 1, 1000)
+    notify = given('notify')
+    if notify is not None:
+        if isinstance(notify, str) and notify.strip().lower() in NOTIFY_MODE_NAMES:
+            entry.notify_mode = NOTIFY_MODE_NAMES[notify.strip().lower()]
+        else:
+            entry.notify_mode = _config_number(notify, int, 'notify', where, 0, 3)
+    groups = given('groups')
+    if groups is not None:
+        entry.groups = tuple(_group_names(groups))
+    return entry
 
-        alert_since = stats.get('alert_since')
-        if alert_since is None:
-            return False
 
-        if now_ts - alert_since <= ALERT_HOLD_SECONDS:
-            return True
+def _group_names(groups):
+    if isinstance(groups, str):
+        return groups.replace(';', ' ').replace(',', ' ').split()
+    return [str(g) for g in groups or ()]
 
-        # clear alert_since after hold expires
-        stats['alert_since'] = None
-        return False
 
-    return False
+def _inventory_from_document(doc, path):
+    """
+    Entries from a parsed TOML/YAML document:
+    {defaults: {...}, groups: {name: {...}}, hosts: [...] or {...}}.
+    A host's settings are its own, then those of its groups (in the order
+    listed), then the defaults.
+    """
+    if not isinstance(doc, dict):
+        raise ConfigError(f"{path}: expected a table/mapping at the top level")
+    defaults = doc.get('defaults') or {}
+    if not isinstance(defaults, dict) or 'host' in defaults:
+        raise ConfigError(f"{path}: 'defaults' must be a table of settings")
+    group_settings = doc.get('groups') or {}
+    if not isinstance(group_settings, dict):
+        raise ConfigError(f"{path}: 'groups' must be a table of group tables")
+    for name, settings in group_settings.items():
+        if not isinstance(settings, dict) or 'host' in settings or 'groups' in settings:
+            raise ConfigError(f"{path}: groups.{name} must be a table of settings")
+    hosts = doc.get('hosts') or []
+    if isinstance(hosts, dict):
+        hosts = [dict(settings or {}, host=host) for host, settings in hosts.items()]
+    elif not isinstance(hosts, list):
+        raise ConfigError(f"{path}: 'hosts' must be a list or a table")
+
+    for i, item in enumerate(hosts):
+        where = f"{path}: hosts[{i}]"
+        if isinstance(item, str):
+            item = {'host': item}
+        elif not isinstance(item, dict):
+            raise ConfigError(f"{where}: expected a host name or a table")
+        fields = dict(defaults)
+        for group in _group_names(item.get('groups', defaults.get('groups'))):
+            fields.update(group_settings.get(group, ()))
+        fields.update(item)
+        yield _host_entry(fields, where)
+
+
+def _inventory_from_csv(f, path):
+    import csv
+    rows = csv.reader(f)
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [h.strip().lower() for h in header]
+    if 'host' not in header:
+        raise ConfigError(f"{path}: the first line must be a header with a 'host' column")
+    for line, row in enumerate(rows, 2):
+        if not row or row[0].lstrip().startswith('#'):
+            continue
+        yield _host_entry(dict(zip(header, row)), f"{path}:{line}")
+
+
+def load_inventory(path):
+    """Parse an inventory file into {host: HostEntry}, in file order."""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == '.csv':
+            with open(path, newline='', encoding='utf-8') as f:
+                entries = list(_inventory_from_csv(f, path))
+        elif ext == '.toml':
+            try:
+                import tomllib
+            except ImportError:
+                try:
+                    import tomli as tomllib
+                except ImportError:
+                    raise ConfigError(f"{path}: TOML needs Python 3.11+ or the 'tomli' package") from None
+            with open(path, 'rb') as f:
+                entries = list(_inventory_from_document(tomllib.load(f), path))
+        elif ext in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ConfigError(f"{path}: YAML needs the 'PyYAML' package") from None
+            loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+            with open(path, encoding='utf-8') as f:
+                entries = list(_inventory_from_document(yaml.load(f, Loader=loader), path))
+        else:
+            raise ConfigError(f"{path}: unknown inventory format (use .toml, .yaml or .csv)")
+    except ConfigError:
+        raise
+    except Exception as e:  # tomllib/yaml syntax errors, unreadable files
+        raise ConfigError(f"{path}: {e}") from e
+
+    inventory = {}
+    for entry in entries:
+        if entry.host in inventory:
+            raise ConfigError(f"{path}: host {entry.host} is listed twice")
+        inventory[entry.host] = entry
+    return inventory
+
+
+class Inventory:
+    """The hosts of a --config file, kept in sync with a HostTable."""
+
+    def __init__(self, path):
+        self.path = path
+        self._stamp = self._stat()
+        self.entries = load_inventory(path)
+        self._checked = time.monotonic()
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def populate(self, table, now):
+        """Add every inventory host to the table (before the scheduler exists)."""
+        for host, entry in self.entries.items():
+            state = table.add(host, now) or table[host]
+            state.configure(entry)
+
+    def maybe_reload(self, table, scheduler, now):
+        """
+        Re-read the file if it changed since the last check and apply the
+        difference. Returns (added, removed, changed) or None. A broken file
+        is logged and the running inventory kept.
+        """
+        mono = time.monotonic()
+        if mono - self._checked < CONFIG_RELOAD_INTERVAL:
+            return None
+        self._checked = mono
+        try:
+            stamp = self._stat()
+        except OSError:
+            return None
+        if stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        try:
+            entries = load_inventory(self.path)
+        except ConfigError as e:
+            logging.error(f"Not reloading inventory: {e}")
+            return None
+        return self.apply(entries, table, scheduler, now)
+
+    def apply(self, entries, table, scheduler, now):
+        old = self.entries
+        added = removed = changed = 0
+        for host in old.keys() - entries.keys():
+            if host in table:
+                scheduler.cancel(host)
+                table.remove(host)
+                removed += 1
+        for host, entry in entries.items():
+            prev = old.get(host)
+            if prev is None:
+                state = table.add(host, now)
+                if state is None:
+                    table[host].configure(entry)
+                    changed += 1
+                else:
+                    state.configure(entry)
+                    scheduler.add(host, now)
+                    added += 1
+            elif prev.settings() != entry.settings() and host in table:
+                table[host].configure(entry)
+                scheduler.reschedule(host, now)
+                changed += 1
+        self.entries = entries
+        logging.info(f"Inventory {self.path} reloaded: {added} added, {removed} removed, {changed} changed")
+        return added, removed, changed
+
 
 # --- Compact view printing ---
 # Colors (ANSI) - Windows 10+ terminals usually support these.
@@ -453,61 +2825,124 @@ ANSI_YELLOW = "\033[93m"
 ANSI_INVERT = "\033[7m"
 
 class NotifierThread(threading.Thread):
+    """
+    Rings the bell every `interval` seconds while any host is alerting.
+
+    Sleeps on the table's alert_changed condition (waking for the next
+    mode 3 hold expiry), so it costs nothing while everything is quiet and
+    never walks the host table.
+    """
+
     def __init__(self, host_stats, interval=1.5):
         super().__init__(daemon=True)
         self.host_stats = host_stats
         self.interval = interval
-        self._stop_event = threading.Event()
+        self.global_silence = False
+        self._stopped = False
 
     def stop(self):
-        self._stop_event.set()
+        with self.host_stats.alert_changed:
+            self._stopped = True
+            self.host_stats.alert_changed.notify_all()
 
     def stopped(self):
-        return self._stop_event.is_set()
+        return self._stopped
+
+    def set_silence(self, silence):
+        with self.host_stats.alert_changed:
+            self.global_silence = silence
+            self.host_stats.alert_changed.notify_all()
 
     def any_alerting(self):
-        if getattr(self, 'global_silence', False):
-            return False
-        for s in self.host_stats.values():
-            if s.get('alerting'):
-                return True
-        return False
+        return not self.global_silence and self.host_stats.alerting_count > 0
 
     def run(self):
-        # Repeatedly play sound while any host is alerting
-        while not self.stopped():
-            if self.any_alerting():
-                try:
-                    playSound()
-                except Exception:
-                    pass
-                # wait small interval but break early if stopped
-                slept = 0.0
-                while slept < self.interval and not self.stopped():
-                    time.sleep(0.1)
-                    slept += 0.1
-            else:
-                # sleep a bit before checking again
-                time.sleep(0.2)
+        table = self.host_stats
+        cond = table.alert_changed
+        while True:
+            with cond:
+                # Sleep until an alert starts or the next mode 3 hold runs out
+                while not self._stopped:
+                    until = table.expire_holds(time.time())
+                    if self.any_alerting():
+                        break
+                    cond.wait(until)
+                if self._stopped:
+                    return
+            try:
+                playSound()
+            except Exception:
+                pass
+            # Pause between bells, but wake at once on stop
+            with cond:
+                cond.wait_for(lambda: self._stopped, timeout=self.interval)
+
+# Lines build_compact_view adds around the host rows (title, rule, column
+# header, trailing blank lines)
+VIEW_CHROME_ROWS = 5
+# Host rows fill 80 columns; loss/jitter/p95 are shown when there is room
+VIEW_COLUMNS = 80
+VIEW_STATS_COLUMNS = 17
+
+def format_host_stats(s):
+    """Loss, jitter and p95 columns of a host row, cached with its history."""
+    cache = s.history.rendered
+    if cache is None:
+        cache = s.history.rendered = {}
+    text = cache.get('stats')
+    if text is None:
+        p95 = s.latency_stats.percentile(95)
+        loss = f"{s.loss_pct:3.0f}%" if s.sent else "-"
+        jitter = f"{s.latency_stats.jitter:5.1f}" if s.latency_stats.count > 1 else "-"
+        p95 = f"{p95:5.0f}" if p95 is not None else "-"
+        text = cache['stats'] = f"{loss:>4} {jitter:>5} {p95:>5} "
+    return text
+
+def scroll_viewport(selected_index, top, rows, count):
+    """Return the first visible row so that selected_index stays in view."""
+    if count <= rows:
+        return 0
+    if selected_index < top:
+        top = selected_index
+    elif selected_index >= top + rows:
+        top = selected_index - rows + 1
+    return max(0, min(top, count - rows))
+
+def build_compact_view(table, selected_index, global_silence, ping_interval, pending_remove, top=0, rows=None, columns=None):
+    """
+    Render the host list. With `rows` set only hosts [top, top + rows) are
+    formatted, so the cost is proportional to the viewport, not the table.
+    The loss/jitter/p95 columns are left out if `columns` is too narrow.
+    """
+    show_stats = columns is None or columns >= VIEW_COLUMNS + VIEW_STATS_COLUMNS
+    total = len(table)
+    if rows is None:
+        top, rows = 0, total
+    visible = table.slice(top, top + rows)
+
+    position = ""
+    if len(visible) < total:
+        position = f" - hosts {top + 1}-{top + len(visible)} of {total}"
 
-def build_compact_view(hosts_order, stats, selected_index, global_silence, ping_interval, pending_remove):
     lines = []
     lines.append(
         " DING - "
         f"Freq: {ping_interval:.1f}s - "
         f"(s)ilence: [{'ON ' if global_silence else 'OFF'}] - "
         "(q)uit • (h)elp"
+        f"{position}"
     )
     lines.append("═" * 80)
 
-    lines.append(" "*4+"host"+" "*20+"| status "+"|     latency"+" "*5+ "| uptime "+"| notification")
+    stats_header = "| loss  jit   p95 " if show_stats else ""
+    lines.append(" "*4+"host"+" "*20+"| status "+"|     latency"+" "*5+ stats_header+"| uptime "+"| notification")
     
 
     modes = ["none", "on up", "on down", "on change"]
-    for i, host in enumerate(hosts_order):
-        s = stats[host]
+    for i, s in enumerate(visible, top):
+        host = s.host
         sel = ">" if i == selected_index else " "
-        state = (s['current_state'] or "?").upper()
+        state = (s.current_state or "?").upper()
         # State label color (only for the UP/DOWN text)
         if state == "UP":
             col = ANSI_GREEN
@@ -525,16 +2960,17 @@ def build_compact_view(hosts_order, stats, selected_index, global_silence, ping_
             row_reset = ANSI_RESET
 
         # High latency warning (only if UP)
-        elif s['latency'] is not None and s['latency'] >= HIGH_LATENCY_MS:
+        elif s.latency is not None and s.latency >= HIGH_LATENCY_MS:
             row_color = ANSI_RED
             row_reset = ANSI_RESET
 
-        lat = f"{s['latency'] or '--':>4}ms" if s['latency'] is not None else "  --  "
-        uptime = format_duration(time.time() - s['state_since']) if s.get('state_since') else "-"
-        spark = render_latency_bar(s.get('results', []))
+        lat = f"{s.latency:>4.0f}ms" if s.latency is not None else "  --  "
+        uptime = format_duration(time.time() - s.state_since) if s.state_since else "-"
+        spark = render_latency_bar(s.history)
+        stats = format_host_stats(s) if show_stats else ""
 
-        mode = modes[s.get('notify_mode', 3)]
-        alert = ANSI_INVERT + " !!! " + ANSI_RESET if s.get('alerting') else ""
+        mode = modes[s.notify_mode]
+        alert = ANSI_INVERT + " !!! " + ANSI_RESET if s.alerting else ""
 
         confirm = ""
         if host == pending_remove:
@@ -547,6 +2983,7 @@ def build_compact_view(hosts_order, stats, selected_index, global_silence, ping_
             f"{col}{state:<4}{ANSI_RESET} "
             f"{lat} "
             f"{spark}  "
+            f"{stats}"
             f"{uptime:<8}  "
             f"{mode:<12} "
             f"{alert}"
@@ -557,6 +2994,56 @@ def build_compact_view(hosts_order, stats, selected_index, global_silence, ping_
     lines.append("\n")
     return "\n".join(lines)
     
+class TerminalRenderer:
+    """
+    Diff-based screen writer. Keeps the previous frame and rewrites only the
+    rows that changed, addressing them with cursor positioning; a frame that
+    is identical to the last one costs no write at all. Autowrap is turned
+    off so a row wider than the terminal is clipped instead of spilling onto
+    the next line, and a change of terminal size redraws everything.
+    """
+
+    def __init__(self, out=None):
+        self.out = out if out is not None else sys.stdout
+        self._rows = None  # None -> screen contents unknown, redraw fully
+        self._size = None
+        self.bytes_written = 0
+        self.frames_written = 0
+
+    def invalidate(self):
+        """Force a full redraw, e.g. after a prompt wrote over the screen."""
+        self._rows = None
+
+    def render(self, frame, size=None):
+        """Write `frame`; `size` is the terminal size it was built for."""
+        rows = frame.split("\n")
+        prev = self._rows
+        if size != self._size:
+            self._size = size
+            prev = None
+        parts = []
+        if prev is None:
+            parts.append("\033[?7l\033[H\033[J")
+            prev = []
+
+        for i, row in enumerate(rows):
+            if i >= len(prev) or prev[i] != row:
+                parts.append(f"\033[{i + 1};1H{row}{ANSI_RESET}\033[K")
+
+        if len(rows) < len(prev):
+            parts.append(f"\033[{len(rows) + 1};1H\033[J")
+
+        self._rows = rows
+        if not parts:
+            return 0
+
+        data = "".join(parts)
+        self.out.write(data)
+        self.out.flush()
+        self.bytes_written += len(data.encode("utf-8"))
+        self.frames_written += 1
+        return len(data)
+
 def build_help_panel():
     return """
 ────────────────────────────────────────────────────────────
@@ -566,6 +3053,8 @@ def build_help_panel():
    (r)emove    Remove selected host
    (s)ilence   Toggle global silence
    (p)ause     Pause / resume pinging
+   (m)etrics   Toggle the self-metrics overlay
+   PgUp/PgDn   Scroll host list (Home/End: first/last)
    (h)elp      Toggle this menu
    (q)uit      Exit ding
 
@@ -577,69 +3066,1253 @@ def build_help_panel():
 """.strip("\n")
 
 
+def build_metrics_panel(snap):
+    """Overlay with the latest LoopMetrics snapshot (None while the first window fills)."""
+    if snap is None:
+        return f" self-metrics: collecting ({METRICS_WINDOW:g}s window)..."
+    ph = snap['phases_ms']
+    mx = snap['phases_max_ms']
+    phases = "  ".join(f"{p} {ph[p]:.2f}/{mx[p]:.1f}" for p in LOOP_PHASES)
+    return "\n".join((
+        f" self-metrics  loops/s {snap['loops_per_sec']:.0f}  busy {snap['busy_pct']:.1f}%  threads {snap['threads']}",
+        f" ms/loop (avg/max)  {phases}",
+        f" probes/s {snap['probes_per_sec']:.0f}  results/s {snap['results_per_sec']:.0f}  in flight {snap['in_flight']}"
+        f"  backlog {snap['backlog']}  lag {snap['lag_ms']:.1f}/{snap['lag_max_ms']:.1f} ms  dns max {snap['resolve_max_ms']:.1f} ms",
+    ))
+
+
+# --- Persistent history ---
+# One append-only file per host: a 16 byte header followed by fixed 16 byte
+# records (timestamp, rtt in ms or NaN, Ping_result.result). Fixed records
+# make the files seekable by index, so readers memory-map them and
+# binary-search a time range without loading the whole file.
+HISTORY_MAGIC = b'DINGHST1'
+HISTORY_HEADER = struct.Struct("<8sII")   # magic, record size, reserved
+HISTORY_RECORD = struct.Struct("<dfB3x")  # timestamp, rtt_ms, status
+HISTORY_FLUSH_INTERVAL = 5.0
+
+def _history_path(directory, host):
+    from urllib.parse import quote
+    return os.path.join(directory, quote(host, safe='') + ".dat")
+
+
+class HistoryStore:
+    """
+    Batched writer for the per-host history files. append() only packs the
+    record into memory and flush(), every `flush_interval` seconds or
+    `batch` records, hands the batch to a writer thread. The files are
+    opened, appended to and closed there, so thousands of hosts neither
+    hold thousands of file descriptors nor stall the main loop.
+    """
+
+    def __init__(self, directory, flush_interval=HISTORY_FLUSH_INTERVAL, batch=65536):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch = batch
+        os.makedirs(directory, exist_ok=True)
+        self._pending = {}
+        self._count = 0
+        self._last_flush = time.monotonic()
+        self._batches = queue.SimpleQueue()  # {host: records}, None to stop
+        self._writer = threading.Thread(target=self._write_loop, name="ding-history", daemon=True)
+        self._writer.start()
+
+    def append(self, host, timestamp, result, latency):
+        buf = self._pending.get(host)
+        if buf is None:
+            buf = self._pending[host] = bytearray()
+        buf += HISTORY_RECORD.pack(timestamp, math.nan if latency is None else latency, result)
+        self._count += 1
+        if self._count >= self.batch:
+            self.flush()
+
+    def maybe_flush(self):
+        if self._count and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if self._pending:
+            self._batches.put(self._pending)
+            self._pending = {}
+        self._count = 0
+
+    def _write_loop(self):
+        while True:
+            pending = self._batches.get()
+            if pending is None:
+                return
+            for host, buf in pending.items():
+                path = _history_path(self.directory, host)
+                try:
+                    with open(path, 'ab') as f:
+                        if f.tell() == 0:
+                            f.write(HISTORY_HEADER.pack(HISTORY_MAGIC, HISTORY_RECORD.size, 0))
+                        f.write(buf)
+                except OSError as e:
+                    logging.error(f"Cannot write history for {host} to {path}: {e}")
+
+    def close(self):
+        """Flush and wait for everything queued to reach the files."""
+        self.flush()
+        self._batches.put(None)
+        self._writer.join()
+
+
+class HistoryReader:
+    """Query the files written by HistoryStore."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def hosts(self):
+        from urllib.parse import unquote
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".dat"))
+        return [unquote(n[:-4]) for n in names]
+
+    def query(self, host, start=None, end=None):
+        """
+        Return [(timestamp, result, latency)] with start <= timestamp < end,
+        latency None for failed probes. Only the pages holding the range are
+        touched.
+        """
+        path = _history_path(self.directory, host)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return []
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= HISTORY_HEADER.size:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, record_size, _ = HISTORY_HEADER.unpack_from(mm, 0)
+                if magic != HISTORY_MAGIC or record_size != HISTORY_RECORD.size:
+                    raise ValueError(f"{path} is not a ding history file")
+                # A torn trailing record (crash mid-write) is ignored
+                count = (size - HISTORY_HEADER.size) // record_size
+                records = _HistoryRecords(mm, count)
+                lo = 0 if start is None else bisect.bisect_left(records, start)
+                hi = count if end is None else bisect.bisect_left(records, end, lo)
+                out = []
+                view = memoryview(mm)[HISTORY_HEADER.size + lo * record_size:HISTORY_HEADER.size + hi * record_size]
+                try:
+                    for ts, rtt, status in HISTORY_RECORD.iter_unpack(view):
+                        out.append((ts, status, None if status != 0 or rtt != rtt else rtt))
+                finally:
+                    view.release()
+                return out
+
+
+class _HistoryRecords:
+    """Sequence view of the record timestamps, for bisect."""
+
+    def __init__(self, mm, count):
+        self._mm = mm
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        return struct.unpack_from("<d", self._mm, HISTORY_HEADER.size + i * HISTORY_RECORD.size)[0]
+
+
+# --- Alert sinks ---
+# State changes are handed to an AlertDispatcher, which never blocks the
+# probe loop: publish() is a put_nowait() on a bounded queue. A dispatcher
+# thread gathers events for ALERT_BATCH_INTERVAL seconds, folds repeated
+# transitions of a flapping host into one event, and hands the batch to
+# every sink. Each sink has its own thread and retries independently, so a
+# slow webhook does not hold up the log file.
+ALERT_QUEUE_SIZE = 10000
+ALERT_BATCH_INTERVAL = 1.0
+ALERT_BATCH_MAX = 500
+ALERT_RETRIES = 3
+ALERT_RETRY_DELAY = 1.0   # doubled after every failed attempt
+ALERT_SINK_BACKLOG = 64   # batches waiting per sink before new ones are dropped
+
+
+class AlertEvent:
+    """A host state change, possibly several folded together."""
+    __slots__ = ('timestamp', 'host', 'old_state', 'new_state', 'transitions', 'loss_pct', 'latency')
+
+    def __init__(self, timestamp, host, old_state, new_state, loss_pct=None, latency=None):
+        self.timestamp = timestamp
+        self.host = host
+        self.old_state = old_state
+        self.new_state = new_state
+        self.transitions = 1
+        self.loss_pct = loss_pct
+        self.latency = latency
+
+    def merge(self, other):
+        """Fold a later event for the same host into this one."""
+        self.timestamp = other.timestamp
+        self.new_state = other.new_state
+        self.transitions += other.transitions
+        self.loss_pct = other.loss_pct
+        self.latency = other.latency
+
+    @property
+    def flapping(self):
+        return self.transitions > 1
+
+    def as_dict(self):
+        return {
+            'timestamp': round(self.timestamp, 3),
+            'host': self.host,
+            'state': self.new_state,
+            'prev_state': self.old_state,
+            'transitions': self.transitions,
+            'loss_pct': None if self.loss_pct is None else round(self.loss_pct, 1),
+            'rtt_ms': self.latency,
+        }
+
+    def message(self):
+        text = f"{self.host} is {(self.new_state or '?').upper()} (was {(self.old_state or '?').upper()})"
+        if self.flapping:
+            text += f", flapping: {self.transitions} changes"
+        return text
+
+
+class AlertSink:
+    """
+    Destination for alert batches. deliver() gets a list of AlertEvent and
+    raises on failure, which makes the dispatcher retry the whole batch.
+    """
+    name = "sink"
+
+    def deliver(self, events):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileAlertSink(AlertSink):
+    """Appends one JSON object per event to a file."""
+    name = "file"
+
+    def __init__(self, path):
+        self.path = path
+
+    def deliver(self, events):
+        data = "".join(json.dumps(e.as_dict(), separators=(',', ':')) + "\n" for e in events)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(data)
+
+
+class SyslogAlertSink(AlertSink):
+    """
+    RFC 3164 messages to a syslog daemon, one datagram per event. `address`
+    is HOST[:PORT] for UDP (default port 514) or the path of a local
+    datagram socket such as /dev/log.
+    """
+    name = "syslog"
+    FACILITY_USER = 1
+    SEVERITY = {'down': 4, 'up': 5}  # warning, notice
+
+    def __init__(self, address):
+        if address.startswith('/'):
+            if not hasattr(socket, 'AF_UNIX'):
+                raise ValueError("local syslog sockets are not supported on this platform")
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.address = address
+        else:
+            if address.startswith('['):       # [v6addr]:port
+                host, _, port = address[1:].partition(']')
+                port = port.lstrip(':')
+            elif address.count(':') == 1:
+                host, _, port = address.partition(':')
+            else:                              # name, v4 or bare v6 address
+                host, port = address, ''
+            port = int(port) if port else 514
+            family, _, _, _, self.address = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+            self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.hostname = socket.gethostname()
+
+    def deliver(self, events):
+        for e in events:
+            pri = self.FACILITY_USER * 8 + self.SEVERITY.get(e.new_state, 5)
+            stamp = time.strftime("%b %d %H:%M:%S", time.localtime(e.timestamp))
+            line = f"<{pri}>{stamp} {self.hostname} ding[{os.getpid()}]: {e.message()}"
+            self.sock.sendto(line.encode('utf-8', 'replace'), self.address)
+
+    def close(self):
+        self.sock.close()
+
+
+class WebhookAlertSink(AlertSink):
+    """POSTs each batch as {"alerts": [...]} JSON to an HTTP(S) URL."""
+    name = "webhook"
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, events):
+        import urllib.request
+        body = json.dumps({'alerts': [e.as_dict() for e in events]}).encode('utf-8')
+        request = urllib.request.Request(
+            self.url, data=body, method='POST',
+            headers={'Content-Type': 'application/json', 'User-Agent': f'ding/{__version__}'},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class CommandAlertSink(AlertSink):
+    """
+    Runs a command once per batch with the events as JSON Lines on stdin.
+    A non-zero exit status counts as a failed delivery.
+    """
+    name = "exec"
+
+    def __init__(self, command, timeout=30.0):
+        self.command = command
+        self.timeout = timeout
+
+    def deliver(self, events):
+        import subprocess
+        data = "".join(json.dumps(e.as_dict(), separators=(',', ':')) + "\n" for e in events)
+        subprocess.run(
+            self.command, shell=True, input=data.encode('utf-8'), timeout=self.timeout,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+        )
+
+
+class _SinkWorker(threading.Thread):
+    """Delivers batches to one sink, retrying with exponential backoff."""
+
+    def __init__(self, sink, retries=ALERT_RETRIES, retry_delay=ALERT_RETRY_DELAY):
+        super().__init__(daemon=True, name=f"ding-alert-{sink.name}")
+        self.sink = sink
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.batches = queue.Queue(ALERT_SINK_BACKLOG)
+        self.delivered = 0
+        self.failed = 0
+        self._stopping = threading.Event()
+
+    def offer(self, batch):
+        try:
+            self.batches.put_nowait(batch)
+        except queue.Full:
+            self.failed += len(batch)
+            logging.warning(f"Alert sink {self.sink.name} is backlogged; dropped {len(batch)} alert(s)")
+
+    def run(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                break
+            self._deliver(batch)
+        self.sink.close()
+
+    def _deliver(self, batch):
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                self.sink.deliver(batch)
+                self.delivered += len(batch)
+                return
+            except Exception as e:
+                logging.warning(f"Alert sink {self.sink.name} failed (attempt {attempt + 1}): {e}")
+            # While shutting down, give up instead of sleeping through retries
+            if attempt == self.retries or self._stopping.wait(delay):
+                break
+            delay *= 2
+        self.failed += len(batch)
+        logging.error(f"Alert sink {self.sink.name}: dropped {len(batch)} alert(s)")
+
+    def stop(self, timeout):
+        """Deliver the backlog for up to `timeout` seconds, without retries."""
+        deadline = time.monotonic() + timeout
+        self._stopping.set()
+        try:
+            self.batches.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.join(max(0.0, deadline - time.monotonic()))
+        if self.is_alive():
+            # Still stuck behind a slow sink: drop the rest, end after this attempt
+            self._drop_backlog()
+
+    def _drop_backlog(self):
+        dropped = 0
+        while True:
+            try:
+                batch = self.batches.get_nowait()
+            except queue.Empty:
+                break
+            if batch is not None:
+                dropped += len(batch)
+        self.batches.put_nowait(None)
+        if dropped:
+            self.failed += dropped
+            logging.error(f"Alert sink {self.sink.name}: dropped {dropped} alert(s) at shutdown")
+
+
+class AlertDispatcher:
+    """Fans state changes out to alert sinks without blocking the caller."""
+
+    def __init__(self, sinks, batch_interval=ALERT_BATCH_INTERVAL, maxsize=ALERT_QUEUE_SIZE):
+        self.batch_interval = batch_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+        self._workers = [_SinkWorker(sink) for sink in sinks]
+        for worker in self._workers:
+            worker.start()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ding-alerts")
+        self._thread.start()
+
+    def publish(self, state, old_state, new_state, now):
+        """Queue a state change of `state` (a HostState). Never blocks."""
+        try:
+            self._queue.put_nowait(AlertEvent(now, state.host, old_state, new_state, state.loss_pct, state.latency))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        q = self._queue
+        running = True
+        while running:
+            event = q.get()
+            if event is None:
+                break
+            # Collect for one batch interval, one entry per host
+            pending = {event.host: event}
+            deadline = time.monotonic() + self.batch_interval
+            while len(pending) < ALERT_BATCH_MAX:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    event = q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if event is None:
+                    running = False
+                    break
+                earlier = pending.get(event.host)
+                if earlier is None:
+                    pending[event.host] = event
+                else:
+                    earlier.merge(event)
+            batch = list(pending.values())
+            for worker in self._workers:
+                worker.offer(batch)
+
+    def close(self, timeout=5.0):
+        """Deliver what is queued, giving the sinks up to `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        for worker in self._workers:
+            worker.stop(max(0.0, deadline - time.monotonic()))
+        if self.dropped:
+            logging.warning(f"Alert queue overflowed; {self.dropped} alert(s) dropped")
+
+
+def start_prometheus(table, argv):
+    """PrometheusExporter for --prometheus, or None."""
+    if not argv.prometheus:
+        return None
+    try:
+        return PrometheusExporter(table, argv.prometheus)
+    except (OSError, ValueError) as e:
+        sys.exit(f"ding: cannot serve Prometheus metrics on {argv.prometheus}: {e}")
+
+
+def make_alert_sinks(argv):
+    """AlertSink instances for the --alert-* options."""
+    sinks = []
+    for path in argv.alert_file or ():
+        sinks.append(FileAlertSink(path))
+    for address in argv.alert_syslog or ():
+        try:
+            sinks.append(SyslogAlertSink(address))
+        except (OSError, ValueError) as e:
+            sys.exit(f"ding: cannot use syslog server {address}: {e}")
+    for url in argv.alert_webhook or ():
+        sinks.append(WebhookAlertSink(url))
+    for command in argv.alert_exec or ():
+        sinks.append(CommandAlertSink(command))
+    return sinks
+
+
+def publish_alert(alerts, state, old_state, new_state, now):
+    """Send real state changes (not the end of warm-up) of non-muted hosts."""
+    if alerts is not None and old_state is not None and new_state != old_state and state.notify_mode != 0:
+        alerts.publish(state, old_state, new_state, now)
+
+
+# --- Prometheus exporter ---
+# --prometheus serves /metrics in the Prometheus text format. Scrapes never
+# touch the host table: a builder thread renders the whole page every
+# PROMETHEUS_REFRESH seconds and the HTTP threads only send the last copy
+# (gzipped once per build). Per-host lines are cached and only re-rendered
+# for hosts that were probed since the previous build.
+PROMETHEUS_REFRESH = 5.0
+PROMETHEUS_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+# LatencyHistogram buckets that lie entirely below each edge, so `le` stays
+# an upper bound; samples in the bucket holding the edge (~3% wide) are
+# counted in the next one up
+_PROMETHEUS_BUCKET_END = tuple(_histogram_index(round(b / HISTOGRAM_UNIT)) for b in PROMETHEUS_BUCKETS_MS)
+
+PROMETHEUS_FAMILIES = (
+    ('ding_probes_sent_total', 'counter', 'Probes sent to the host.'),
+    ('ding_probes_received_total', 'counter', 'Replies received from the host.'),
+    ('ding_host_up', 'gauge', '1 if the host is UP, 0 if DOWN (absent during warm-up).'),
+    ('ding_host_state_since_seconds', 'gauge', 'Unix time of the last UP/DOWN change.'),
+    ('ding_rtt_milliseconds', 'histogram', 'Round-trip time of the replies.'),
+    ('ding_rtt_jitter_milliseconds', 'gauge', 'RFC 3550 interarrival jitter.'),
+)
+
+
+def _prometheus_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prometheus_host_lines(state):
+    """One string per PROMETHEUS_FAMILIES entry for this host."""
+    label = f'host="{_prometheus_label(state.host)}"'
+    ls = state.latency_stats
+    up = '' if state.current_state is None else f'ding_host_up{{{label}}} {int(state.current_state == "up")}\n'
+
+    hist = ls.histogram
+    buckets = []
+    cumulative = 0
+    start = 0
+    for edge, end in zip(PROMETHEUS_BUCKETS_MS, _PROMETHEUS_BUCKET_END):
+        if hist is not None:
+            cumulative += sum(hist.counts[start:end])
+        start = end
+        buckets.append(f'ding_rtt_milliseconds_bucket{{{label},le="{edge:g}"}} {cumulative}\n')
+    buckets.append(
+        f'ding_rtt_milliseconds_bucket{{{label},le="+Inf"}} {ls.count}\n'
+        f'ding_rtt_milliseconds_sum{{{label}}} {ls.mean * ls.count:.3f}\n'
+        f'ding_rtt_milliseconds_count{{{label}}} {ls.count}\n'
+    )
+    return (
+        f'ding_probes_sent_total{{{label}}} {state.sent}\n',
+        f'ding_probes_received_total{{{label}}} {state.received}\n',
+        up,
+        f'ding_host_state_since_seconds{{{label}}} {state.state_since:.3f}\n',
+        "".join(buckets),
+        f'ding_rtt_jitter_milliseconds{{{label}}} {ls.jitter:.3f}\n',
+    )
+
+
+class PrometheusExporter:
+    """
+    Embedded /metrics endpoint for a HostTable. `address` is PORT or
+    HOST:PORT; a bare port listens on every interface.
+    """
+
+    def __init__(self, table, address, refresh=PROMETHEUS_REFRESH):
+        host, _, port = str(address).rpartition(':')
+        self.table = table
+        self.refresh = refresh
+        self.build_seconds = 0.0
+        self._cache = {}  # host -> (sent, state_since, current_state, lines)
+        self._page = (b'', b'')  # (plain, gzipped), swapped in one assignment
+        self._stop = threading.Event()
+
+        import http.server
+        exporter = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                plain, packed = exporter._page
+                gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+                body = packed if gzipped else plain
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                if gzipped:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f"prometheus: {self.address_string()} {format % args}")
+
+        self._server = http.server.ThreadingHTTPServer((host.strip('[]'), int(port)), Handler)
+        self._server.daemon_threads = True
+        self.build()
+        threading.Thread(target=self._server.serve_forever, name="ding-prometheus", daemon=True).start()
+        threading.Thread(target=self._build_loop, name="ding-prometheus-build", daemon=True).start()
+
+    def _build_loop(self):
+        while not self._stop.wait(self.refresh):
+            try:
+                self.build()
+            except Exception:
+                logging.exception("Building the Prometheus page failed")
+
+    def build(self):
+        """Render the page from the table (runs off the probe loop)."""
+        started = time.perf_counter()
+        table = self.table
+        cache = self._cache
+        fresh = {}
+        chunks = []
+        for host in list(table.order):
+            state = table.get(host)
+            if state is None:
+                continue
+            key = (state.sent, state.state_since, state.current_state)
+            cached = cache.get(host)
+            if cached is None or cached[0] != key:
+                cached = (key, _prometheus_host_lines(state))
+            fresh[host] = cached
+            chunks.append(cached[1])
+        self._cache = fresh
+
+        out = []
+        for i, (name, kind, text) in enumerate(PROMETHEUS_FAMILIES):
+            out.append(f"# HELP {name} {text}\n# TYPE {name} {kind}\n")
+            out.extend(c[i] for c in chunks)
+        out.append(
+            "# HELP ding_hosts Hosts being monitored.\n# TYPE ding_hosts gauge\n"
+            f"ding_hosts {len(chunks)}\n"
+            "# HELP ding_exporter_build_seconds Time spent rendering the previous page.\n"
+            "# TYPE ding_exporter_build_seconds gauge\n"
+            f"ding_exporter_build_seconds {self.build_seconds:.6f}\n"
+        )
+        plain = "".join(out).encode('utf-8')
+        import gzip
+        self._page = (plain, gzip.compress(plain, compresslevel=1))
+        self.build_seconds = time.perf_counter() - started
+
+    def close(self):
+        self._stop.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Headless streaming output ---
+STATUS_NAMES = {0: "ok", 1: "timeout", 2: "error"}
+
+class ResultWriter:
+    """
+    Streams one record per probe to a text stream. Records are buffered and
+    written in batches (every `batch` records or `flush_interval` seconds) so
+    a pipe is not hit with one write() per probe.
+    """
+    fields = ('timestamp', 'host', 'ip', 'seq', 'status', 'rtt_ms', 'resolve_ms', 'state', 'prev_state', 'changed')
+
+    def __init__(self, stream, batch=1024, flush_interval=1.0):
+        self.stream = stream
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.records = 0
+        self._buf = []
+        self._last_flush = time.monotonic()
+
+    def record(self, stats, response, old_state, new_state, now):
+        return (
+            round(now, 3),
+            stats.host,
+            response.ip,
+            stats.sent,
+            STATUS_NAMES.get(response.result, "error"),
+            response.latency if response.result == 0 else None,
+            None if response.resolve_ms is None else round(response.resolve_ms, 3),
+            new_state,
+            old_state,
+            new_state != old_state,
+        )
+
+    def format(self, record):
+        raise NotImplementedError
+
+    def write(self, stats, response, old_state, new_state, now):
+        self._buf.append(self.format(self.record(stats, response, old_state, new_state, now)))
+        self.records += 1
+        if len(self._buf) >= self.batch:
+            self.flush()
+
+    def maybe_flush(self):
+        if self._buf and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buf:
+            return
+        data = "".join(self._buf)
+        self._buf.clear()
+        self.stream.write(data)
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+class JsonlWriter(ResultWriter):
+    def format(self, record):
+        return json.dumps(dict(zip(self.fields, record)), separators=(',', ':')) + "\n"
+
+
+class CsvWriter(ResultWriter):
+    def __init__(self, stream, **kwargs):
+        super().__init__(stream, **kwargs)
+        import csv
+        self._line = io.StringIO()
+        self._csv = csv.writer(self._line, lineterminator="\n")
+        self._buf.append(self.format(self.fields))
+
+    def format(self, record):
+        self._line.seek(0)
+        self._line.truncate()
+        self._csv.writerow(record)
+        return self._line.getvalue()
+
+
+RESULT_WRITERS = {
+    'jsonl': JsonlWriter,
+    'csv': CsvWriter,
+}
+
+
+def detach_stdout():
+    """
+    After a BrokenPipeError on stdout (reader gone, e.g. `| head`), point it
+    at devnull so the interpreter's final flush does not raise again.
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+
+def run_headless(argv, inventory=None):
+    """
+    --output mode: probe and stream results, no screen, keyboard or sound.
+    Runs until interrupted (Ctrl+C) or the reader goes away.
+    """
+    if argv.output_file and argv.output_file != '-':
+        stream = open(argv.output_file, 'a', encoding='utf-8', newline='', buffering=1 << 16)
+    else:
+        stream = sys.stdout
+    writer = RESULT_WRITERS[argv.output](stream)
+
+    table = HostTable(argv.history)
+    store = HistoryStore(argv.history_dir) if argv.history_dir else None
+    sinks = make_alert_sinks(argv)
+    alerts = AlertDispatcher(sinks) if sinks else None
+    now = time.time()
+    if inventory is not None:
+        inventory.populate(table, now)
+    engine = make_engine(argv.engine, len(table) + len(argv.hosts), argv.workers)
+    scheduler = ProbeScheduler(table, engine, argv.interval, argv.max_pps, argv.backoff_max)
+    for host in table.order:
+        scheduler.add(host, now)
+    feed = HostFeed(iter_targets(argv.hosts))
+    feed.feed(table, scheduler, now)
+    metrics_export = MetricsExporter(argv.metrics_file) if argv.metrics_file else None
+    metrics = scheduler.metrics = LoopMetrics() if metrics_export else None
+    exporter = start_prometheus(table, argv)
+
+    try:
+        while True:
+            now = time.time()
+            if not feed.done:
+                feed.feed(table, scheduler, now)
+            scheduler.schedule_due(now)
+            if metrics is not None:
+                metrics.mark('schedule')
+            for host, response in scheduler.collect(now):
+                stats = table[host]
+                old_state, new_state = table.apply_result(host, response, now)
+                writer.write(stats, response, old_state, new_state, now)
+                publish_alert(alerts, stats, old_state, new_state, now)
+                if store is not None:
+                    store.append(host, now, response.result, response.latency)
+                if metrics is not None:
+                    metrics.result(response)
+            writer.maybe_flush()
+            if store is not None:
+                store.maybe_flush()
+            if inventory is not None:
+                inventory.maybe_reload(table, scheduler, now)
+            if metrics is not None:
+                metrics.mark('results')
+            scheduler.wait(0 if feed.pending(scheduler) else writer.flush_interval)
+            if metrics is not None:
+                metrics.mark('wait')
+                if metrics.end_loop(scheduler):
+                    metrics_export.write(metrics.snapshot)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        if stream is sys.stdout:
+            detach_stdout()
+    finally:
+        try:
+            writer.close()
+        except (BrokenPipeError, OSError):
+            pass
+        engine.close()
+        dns_cache.close()
+        if store is not None:
+            store.close()
+        if alerts is not None:
+            alerts.close()
+        if exporter is not None:
+            exporter.close()
+        if stream is not sys.stdout:
+            stream.close()
+
+
+# --- Target lists ---
+def read_targets(f):
+    """Host tokens from a hosts file: whitespace or comma separated, '#' starts a comment."""
+    for line in f:
+        for token in line.split('#', 1)[0].replace(',', ' ').split():
+            yield token
+
+
+def _ipv4_int(text):
+    return struct.unpack('!I', socket.inet_aton(text))[0]
+
+
+def expand_target(token):
+    """
+    CIDR blocks (10.0.0.0/24) and ranges (10.1.2.1-254, 10.1.2.250-10.1.3.5)
+    as their addresses, generated one at a time; anything else, such as a
+    hostname, as is. Malformed blocks and ranges raise ValueError.
+    """
+    if '/' in token:
+        address, _, bits = token.partition('/')
+        if not _is_ipv4_literal(address):
+            raise ValueError(f"{address!r} is not an IPv4 address")
+        if not bits.isdigit() or int(bits) > 32:
+            raise ValueError(f"{bits!r} is not a valid prefix length")
+        size = 1 << (32 - int(bits))
+        start = _ipv4_int(address) & -size
+        end = start + size - 1
+        if size > 2:
+            start, end = start + 1, end - 1  # skip the network and broadcast addresses
+    else:
+        first, sep, last = token.rpartition('-')
+        if not sep or not _is_ipv4_literal(first):
+            yield token
+            return
+        start = _ipv4_int(first)
+        if last.isdigit() and int(last) <= 255:
+            end = (start & ~0xff) | int(last)
+        elif _is_ipv4_literal(last):
+            end = _ipv4_int(last)
+        else:
+            raise ValueError(f"{last!r} is not a last octet or an IPv4 address")
+        if end < start:
+            raise ValueError("the range ends before it starts")
+    pack = struct.Struct('!I').pack
+    for n in range(start, end + 1):
+        yield socket.inet_ntoa(pack(n))
+
+
+def check_target(token):
+    """Raise ValueError if token is a malformed CIDR block or range."""
+    next(expand_target(token), None)
+
+
+def iter_targets(tokens):
+    """Expand tokens one address at a time; malformed ones are reported and skipped."""
+    for token in tokens:
+        try:
+            yield from expand_target(token)
+        except ValueError as e:
+            print(f"ding: skipping {token!r}: {e}", file=sys.stderr)
+
+
+HOST_FEED_BATCH = 256          # hosts admitted per main-loop pass
+HOST_FEED_MAX_IN_FLIGHT = 1024
+
+class HostFeed:
+    """
+    Admits the hosts of lazily expanded target lists into a HostTable and
+    its ProbeScheduler from the main loop, a batch per pass and only while
+    fewer than `max_in_flight` probes are out. A /16 starts probing at once
+    and its HostStates are created as it is admitted, instead of expanding
+    65k hosts before the first probe.
+    """
+
+    def __init__(self, targets=(), batch=HOST_FEED_BATCH, max_in_flight=HOST_FEED_MAX_IN_FLIGHT):
+        self.batch = batch
+        self.max_in_flight = max_in_flight
+        self._sources = collections.deque()
+        self.extend(targets)
+
+    def extend(self, targets):
+        """Queue more hosts, e.g. a range typed at the (a)dd prompt."""
+        self._sources.append(iter(targets))
+
+    @property
+    def done(self):
+        return not self._sources
+
+    def pending(self, scheduler):
+        """True if there are hosts left and room to admit them now."""
+        return bool(self._sources) and len(scheduler) < self.max_in_flight
+
+    def feed(self, table, scheduler, now):
+        """Add up to `batch` new hosts; returns how many were added."""
+        added = 0
+        if len(scheduler) >= self.max_in_flight:
+            return added
+        while self._sources:
+            for host in self._sources[0]:
+                if table.add(host, now) is not None:
+                    scheduler.add(host, now)
+                    added += 1
+                    if added >= self.batch:
+                        return added
+            self._sources.popleft()
+        return added
+
+
+# --- Sweep mode ---
+# --sweep pings a list of targets --count times and exits, fping style. The
+# targets are consumed as a stream and at most `window` of them are open
+# (in flight or waiting for their next round) at once, so memory does not
+# grow with the length of the list.
+SWEEP_WINDOW = 1024  # default probes in flight
+
+
+class SweepHost:
+    """
+    Counters for one target while it is being swept. `rounds` counts the
+    probes submitted, `sent` only those that went out (not failed lookups
+    or sends).
+    """
+    __slots__ = ('host', 'rounds', 'sent', 'received', 'errors', 'sent_at', 'rtt_min', 'rtt_max', 'rtt_sum')
+
+    def __init__(self, host):
+        self.host = host
+        self.rounds = 0
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.sent_at = 0.0
+        self.rtt_min = None
+        self.rtt_max = None
+        self.rtt_sum = 0
+
+    def add(self, response):
+        if response.result != 2:
+            self.sent += 1
+        if response.result == 0 and response.latency is not None:
+            rtt = response.latency
+            self.received += 1
+            self.rtt_sum += rtt
+            if self.rtt_min is None or rtt < self.rtt_min:
+                self.rtt_min = rtt
+            if self.rtt_max is None or rtt > self.rtt_max:
+                self.rtt_max = rtt
+        elif response.result == 2:
+            self.errors += 1
+
+    def line(self, count):
+        if count == 1 or not self.sent:
+            if self.received:
+                return f"{self.host} is alive ({self.rtt_min:.2f} ms)"
+            return f"{self.host} is {'unresolvable' if self.errors else 'unreachable'}"
+        loss = 100 * (self.sent - self.received) // self.sent
+        text = f"{self.host} : xmt/rcv/%loss = {self.sent}/{self.received}/{loss}%"
+        if self.received:
+            text += f", min/avg/max = {self.rtt_min:.2f}/{self.rtt_sum / self.received:.2f}/{self.rtt_max:.2f}"
+        return text
+
+
+class Sweep:
+    """
+    Pipelines `count` probes to each target through a probe engine, keeping
+    up to `window` probes in flight and at most `max_pps` sends per second.
+    Rounds to the same target are `interval` seconds apart. Finished targets
+    are handed to `on_done` and only their totals are kept.
+    """
+
+    def __init__(self, engine, count=1, interval=DEFAULT_PING_INTERVAL, window=SWEEP_WINDOW, max_pps=None, options=None):
+        self.engine = engine
+        self.count = count
+        self.interval = interval
+        self.window = window
+        self.max_pps = max_pps
+        self.options = options or {}  # host -> ProbeOptions (--config hosts)
+        self.targets = 0
+        self.alive = 0
+        self.errors = 0
+        self.sent = 0
+        self.received = 0
+        self.rtt_min = None
+        self.rtt_max = None
+        self.rtt_sum = 0
+        self.elapsed = 0.0
+        self._bucket = TokenBucket(max_pps, time.monotonic())
+
+    def _finish(self, target):
+        self.targets += 1
+        self.sent += target.sent
+        self.received += target.received
+        if target.received:
+            self.alive += 1
+            self.rtt_sum += target.rtt_sum
+            if self.rtt_min is None or target.rtt_min < self.rtt_min:
+                self.rtt_min = target.rtt_min
+            if self.rtt_max is None or target.rtt_max > self.rtt_max:
+                self.rtt_max = target.rtt_max
+        elif target.errors:
+            self.errors += 1
+
+    def run(self, targets, on_done=None):
+        """Probe every host of the `targets` iterable; returns self with the totals filled in."""
+        targets = iter(targets)
+        completed = queue.SimpleQueue()  # (SweepHost, future) pushed as probes finish
+        waiting = []  # heap of (due, n, SweepHost) for targets with rounds left
+        order = itertools.count()
+        upcoming = next(targets, None)
+        in_flight = 0
+        open_targets = 0
+        started = time.monotonic()
+
+        def send(target, now):
+            fut = self.engine.submit(target.host, self.options.get(target.host))
+            target.rounds += 1
+            target.sent_at = now
+            fut.add_done_callback(lambda f, t=target: completed.put((t, f)))
+
+        try:
+            while True:
+                now = time.monotonic()
+                throttled = False
+                while in_flight < self.window:
+                    if waiting and waiting[0][0] <= now:
+                        if not self._bucket.take(now):
+                            throttled = True
+                            break
+                        send(heapq.heappop(waiting)[2], now)
+                    elif upcoming is not None and open_targets < self.window:
+                        if not self._bucket.take(now):
+                            throttled = True
+                            break
+                        send(SweepHost(upcoming), now)
+                        upcoming = next(targets, None)
+                        open_targets += 1
+                    else:
+                        break
+                    in_flight += 1
+
+                if upcoming is None and not open_targets:
+                    break
+
+                timeout = None
+                if throttled:
+                    timeout = max(0.0, self._bucket.next_token() - now)
+                elif waiting and in_flight < self.window:
+                    timeout = max(0.0, waiting[0][0] - now)
+                try:
+                    batch = [completed.get(timeout=timeout)]
+                except queue.Empty:
+                    continue
+                while True:
+                    try:
+                        batch.append(completed.get_nowait())
+                    except queue.Empty:
+                        break
+
+                now = time.monotonic()
+                for target, fut in batch:
+                    in_flight -= 1
+                    try:
+                        response = fut.result()
+                    except Exception as e:
+                        logging.exception(f"Ping error for {target.host}: {e}")
+                        response = Ping_result(2, None, target.host)
+                    target.add(response)
+                    if target.rounds < self.count:
+                        heapq.heappush(waiting, (max(now, target.sent_at + self.interval), next(order), target))
+                    else:
+                        open_targets -= 1
+                        self._finish(target)
+                        if on_done is not None:
+                            on_done(target)
+        finally:
+            self.elapsed = time.monotonic() - started
+        return self
+
+    def summary(self):
+        lines = [
+            f"{self.targets} targets: {self.alive} alive, {self.targets - self.alive - self.errors} unreachable"
+            + (f", {self.errors} unresolvable" if self.errors else ""),
+            f"{self.sent} probes sent, {self.received} replies"
+            + (f" ({100 * (self.sent - self.received) / self.sent:.1f}% loss)" if self.sent else ""),
+        ]
+        if self.received:
+            lines.append(f"rtt min/avg/max = {self.rtt_min:.2f}/{self.rtt_sum / self.received:.2f}/{self.rtt_max:.2f} ms")
+        rate = self.sent / self.elapsed if self.elapsed else 0.0
+        lines.append(f"{self.elapsed:.2f} s elapsed, {rate:.0f} probes/s")
+        return "\n".join(lines)
+
+
+def run_sweep(argv, inventory=None):
+    """
+    --sweep mode: probe every target --count times, print one line per
+    target as it finishes and a summary on stderr. Exit status is 0 when
+    every target answered and 1 otherwise.
+    """
+    sources = [iter_targets(argv.hosts)]
+    options = {}
+    if inventory is not None:
+        options = {host: entry.probe_options() for host, entry in inventory.entries.items()}
+        sources.append(iter(inventory.entries))
+    hosts_file = None
+    if argv.hosts_file:
+        try:
+            hosts_file = sys.stdin if argv.hosts_file == '-' else open(argv.hosts_file, encoding='utf-8')
+        except OSError as e:
+            sys.exit(f"ding: {e}")
+        sources.append(iter_targets(read_targets(hosts_file)))
+
+    out = sys.stdout
+    if argv.alive:
+        on_done = lambda t: t.received and out.write(t.host + "\n")
+    else:
+        on_done = lambda t: out.write(t.line(argv.count) + "\n")
+
+    engine = make_engine(argv.engine, argv.window, argv.workers)
+    sweep = Sweep(engine, argv.count, argv.interval, argv.window, argv.max_pps, options)
+    interrupted = False
+    try:
+        sweep.run(itertools.chain.from_iterable(sources), on_done)
+        out.flush()
+    except KeyboardInterrupt:
+        interrupted = True
+    except BrokenPipeError:
+        detach_stdout()
+    finally:
+        engine.close()
+        dns_cache.close()
+        if hosts_file is not None and hosts_file is not sys.stdin:
+            hosts_file.close()
+    print(("interrupted\n" if interrupted else "") + sweep.summary(), file=sys.stderr)
+    sys.exit(0 if sweep.targets and sweep.alive == sweep.targets and not interrupted else 1)
+
+
 def ding():
+    argv = parseArgs()
+    # IcmpSendEcho2 (the threads engine) works unprivileged; only the raw
+    # socket behind --engine mux needs admin on Windows
+    if os.name == "nt" and argv.engine == 'mux' and not is_admin():
+        relaunch_as_admin()
+    logging.basicConfig(
+        level=getattr(logging, argv.log_level),
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        filename='ding.log',
+        filemode='a'
+    )
+    dns_cache.ttl = argv.dns_ttl
+    set_probe_defaults(round(argv.timeout * 1000), argv.size, argv.ttl)
+
+    inventory = None
+    if argv.config:
+        try:
+            inventory = Inventory(argv.config)
+        except (ConfigError, OSError) as e:
+            sys.exit(f"ding: {e}")
+    if argv.hosts_file and not argv.sweep:
+        try:
+            if argv.hosts_file == '-':
+                tokens = list(read_targets(sys.stdin))
+            else:
+                with open(argv.hosts_file, encoding='utf-8') as f:
+                    tokens = list(read_targets(f))
+        except OSError as e:
+            sys.exit(f"ding: {e}")
+        # Report malformed blocks and ranges now, before the console owns the screen
+        for token in tokens:
+            try:
+                check_target(token)
+            except ValueError as e:
+                print(f"ding: skipping {token!r}: {e}", file=sys.stderr)
+                continue
+            argv.hosts.append(token)
+
+    if argv.sweep:
+        run_sweep(argv, inventory)
+    elif argv.output:
+        run_headless(argv, inventory)
+    else:
+        run_console(argv, inventory)
+
+
+def run_console(argv, inventory=None):
     def cancel_pending_remove():
         nonlocal pending_remove
         if pending_remove is not None:
             pending_remove = None
 
+    import shutil
+
     try:
-        argv = parseArgs()
-        logging.basicConfig(
-            level=getattr(logging, argv.log_level),
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            filename='ding.log',
-            filemode='a'
-        )
+        ping_interval = argv.interval
+        history_size = argv.history
 
-        ping_interval = DEFAULT_PING_INTERVAL
+        console_setup()
 
         # Hide cursor
         sys.stdout.write("\033[?25l")
         sys.stdout.flush()
 
-        hosts_order = list(argv.hosts)
-        host_stats = {}
+        host_stats = HostTable(history_size)
+        hosts_order = host_stats.order
         global_silence = False
         show_help = False
         paused = False
         pending_remove = None
 
         now0 = time.time()
-        for host in hosts_order:
-            host_stats[host] = {
-                'sent': 0,
-                'received': 0,
-                'results': [],
-
-                'current_state': None,
-                'state_since': now0,
-                'next_ping_time': now0,
-
-                'consecutive_up': 0,
-                'consecutive_down': 0,
-                'warmup_left': WARMUP_PINGS,
-                'warmup_done': False,
-
-                'status_msg': "",
-                'notify_mode': 3,
-                'alerting': False,
-                'alert_since': None,
-                'latency': None,
-            }
+        if inventory is not None:
+            inventory.populate(host_stats, now0)
 
         selected_index = 0
+        view_top = 0
+        page_rows = len(hosts_order)
         compact_mode = True
 
-        executor = ThreadPoolExecutor(max_workers=max(8, len(hosts_order)))
-        futures = {}
+        engine = make_engine(argv.engine, len(hosts_order) + len(argv.hosts), argv.workers)
+        scheduler = ProbeScheduler(host_stats, engine, ping_interval, argv.max_pps, argv.backoff_max)
+        store = HistoryStore(argv.history_dir) if argv.history_dir else None
+        sinks = make_alert_sinks(argv)
+        alerts = AlertDispatcher(sinks) if sinks else None
+        for host in hosts_order:
+            scheduler.add(host, now0)
+        feed = HostFeed(iter_targets(argv.hosts))
+        feed.feed(host_stats, scheduler, now0)
+
+        metrics_export = MetricsExporter(argv.metrics_file) if argv.metrics_file else None
+        show_metrics = argv.metrics
+        metrics = LoopMetrics() if show_metrics or metrics_export else None
+        scheduler.metrics = metrics
+        exporter = start_prometheus(host_stats, argv)
 
         notifier = NotifierThread(host_stats, interval=1.0)
-        notifier.global_silence = global_silence
+        notifier.set_silence(global_silence)
         notifier.start()
 
+        renderer = TerminalRenderer()
+
         # Timing control
         UI_REFRESH_INTERVAL = 0.15
+        INPUT_POLL_INTERVAL = 0.02
         last_ui_refresh = 0.0
 
         running = True
@@ -648,98 +4321,55 @@ def ding():
 
             # === 0. Schedule new pings based on frequency ===
             if not paused:
-                for host in hosts_order:
-                    if host not in futures:
-                        if now >= host_stats[host]['next_ping_time']:
-                            futures[host] = executor.submit(decideModeAndPing, host)
-                            host_stats[host]['next_ping_time'] = now + ping_interval
+                if not feed.done:
+                    feed.feed(host_stats, scheduler, now)
+                scheduler.schedule_due(now)
+            if metrics is not None:
+                metrics.mark('schedule')
 
             # === 1. Process completed pings ===
-            for host in list(futures.keys()):
-                fut = futures[host]
-                if fut.done():
-                    try:
-                        response = fut.result()
-                    except Exception as e:
-                        logging.exception(f"Ping error for {host}: {e}")
-                        response = Ping_result(2, None, host)
-
-                    stats = host_stats[host]
-                    stats['sent'] += 1
-                    stats['results'].append(response)
-                    if len(stats['results']) > 100:
-                        stats['results'] = stats['results'][-100:]
-
-                    stats['latency'] = response.latency if response.result == 0 else None
-
-                    old_state = stats['current_state']
-
-                    if response.result == 0:
-                        stats['consecutive_up'] += 1
-                        stats['consecutive_down'] = 0
-                    else:
-                        stats['consecutive_down'] += 1
-                        stats['consecutive_up'] = 0
-
-                    # --- Warm-up phase ---
-                    if not stats['warmup_done']:
-                        stats['warmup_left'] -= 1
-
-                        if stats['warmup_left'] <= 0:
-                            # Decide initial state by majority
-                            stats['current_state'] = "down" if stats['consecutive_down'] >= stats['consecutive_up'] else "up"
-                            stats['state_since'] = now
-                            stats['warmup_done'] = True
-                            stats['alert_since'] = None
-                            stats['alerting'] = False
-
-                        # No alerts during warmup
-                        stats['alerting'] = False
-                        continue  # skip alert/state logic until warmup finishes
-
-                    # --- Normal state transitions ---
-                    new_state = old_state
-
-                    if old_state == "up" and stats['consecutive_down'] >= DOWN_THRESHOLD:
-                        new_state = "down"
-
-                    elif old_state == "down" and stats['consecutive_up'] >= UP_THRESHOLD:
-                        new_state = "up"
-
-                    if new_state != old_state:
-                        stats['current_state'] = new_state
-                        stats['state_since'] = now
-
-
-                    if response.result == 0:
-                        stats['received'] += 1
-
-                    stats['status_msg'] = f"{new_state.upper()} {format_duration(now - stats['state_since'])}"
-
-                    if not stats['warmup_done']:
-                        stats['alerting'] = False
-                    else:
-                        stats['alerting'] = evaluate_alert(stats, new_state, old_state)
-
-                    # Immediately reschedule next ping
-                    del futures[host]
+            for host, response in scheduler.collect(now):
+                old_state, new_state = host_stats.apply_result(host, response, now)
+                publish_alert(alerts, host_stats[host], old_state, new_state, now)
+                if store is not None:
+                    store.append(host, now, response.result, response.latency)
+                if metrics is not None:
+                    metrics.result(response)
+            if store is not None:
+                store.maybe_flush()
+            if inventory is not None and inventory.maybe_reload(host_stats, scheduler, now):
+                if pending_remove not in host_stats:
+                    pending_remove = None
+                selected_index = min(selected_index, max(0, len(hosts_order) - 1))
+                last_ui_refresh = 0
+            if metrics is not None:
+                metrics.mark('results')
 
             # === 2. Refresh UI at fixed interval (smooth) ===
             if now - last_ui_refresh >= UI_REFRESH_INTERVAL:
                 last_ui_refresh = now
                 parts = []
+                if show_metrics:
+                    parts.append(build_metrics_panel(metrics.snapshot))
                 if show_help:
                     parts.append(build_help_panel())
 
+                term_size = shutil.get_terminal_size()
+                term_columns, term_rows = term_size
                 if compact_mode:
+                    used = VIEW_CHROME_ROWS + sum(p.count("\n") + 1 for p in parts)
+                    page_rows = max(1, term_rows - used)
+                    view_top = scroll_viewport(selected_index, view_top, page_rows, len(hosts_order))
                     parts.append(
                         build_compact_view(
-                            hosts_order,
                             host_stats,
                             selected_index,
                             global_silence,
                             ping_interval,
-                            pending_remove
+                            pending_remove,
+                            top=view_top,
+                            rows=page_rows,
+                            columns=term_columns
                         )
                     )
                 else:
@@ -747,39 +4377,40 @@ def ding():
 
                 output = "\n".join(parts)
 
-
-                # Single write: no flicker!
-                sys.stdout.write("\033[H")  # Move to home without clearing
-                sys.stdout.write("\033[J")  # Clear from cursor to end (safer)
-                sys.stdout.write(output)
-                sys.stdout.flush()
+                # Only changed rows are written; nothing at all if identical
+                renderer.render(output, term_size)
+            if metrics is not None:
+                metrics.mark('render')
 
             # === 3. Non-blocking keyboard input ===
-            if msvcrt.kbhit():
-                ch = msvcrt.getwch()
+            if kbhit():
+                ch = getwch()
                 if ch in ('\x00', '\xe0'):  # Special keys
                     cancel_pending_remove()
-                    ch2 = msvcrt.getwch()
+                    ch2 = getwch()
 
-                    if ch2 == 'H':      # Up
+                    if ch2 == 'H' and hosts_order:    # Up
                         selected_index = (selected_index - 1) % len(hosts_order)
 
-                    elif ch2 == 'P':    # Down
+                    elif ch2 == 'P' and hosts_order:  # Down
                         selected_index = (selected_index + 1) % len(hosts_order)
 
+                    elif ch2 in ('I', 'Q') and hosts_order:  # Page up / down
+                        step = page_rows if ch2 == 'Q' else -page_rows
+                        selected_index = max(0, min(len(hosts_order) - 1, selected_index + step))
+
+                    elif ch2 in ('G', 'O') and hosts_order:  # Home / End
+                        selected_index = 0 if ch2 == 'G' else len(hosts_order) - 1
+
                     elif ch2 == 'K':    # Left  -> previous notify mode
                         if hosts_order:
-                            host = hosts_order[selected_index]
-                            mode = host_stats[host]['notify_mode']
-                            host_stats[host]['notify_mode'] = (mode - 1) % 4
-                            host_stats[host]['alert_since'] = None
+                            stats = host_stats[hosts_order[selected_index]]
+                            stats.set_notify_mode(stats.notify_mode - 1)
 
                     elif ch2 == 'M':    # Right -> next notify mode
                         if hosts_order:
-                            host = hosts_order[selected_index]
-                            mode = host_stats[host]['notify_mode']
-                            host_stats[host]['notify_mode'] = (mode + 1) % 4
-                            host_stats[host]['alert_since'] = None
+                            stats = host_stats[hosts_order[selected_index]]
+                            stats.set_notify_mode(stats.notify_mode + 1)
 
                 else:
                     key = ch.lower()
@@ -790,17 +4421,25 @@ def ding():
                     elif key == '\t':
                         compact_mode = not compact_mode
                     elif key in 'jk':
-                        selected_index = (selected_index + (1 if key == 'j' else -1)) % len(hosts_order)
+                        if hosts_order:
+                            selected_index = (selected_index + (1 if key == 'j' else -1)) % len(hosts_order)
                     elif key in '0123':
-                        host = hosts_order[selected_index]
-                        host_stats[host]['notify_mode'] = int(key)
-                        host_stats[host]['alert_since'] = None  # reset hold timer
+                        if hosts_order:
+                            host = hosts_order[selected_index]
+                            host_stats[host].set_notify_mode(int(key))
                     elif key == 's':
                         global_silence = not global_silence
-                        notifier.global_silence = global_silence
+                        notifier.set_silence(global_silence)
                         last_ui_refresh = 0
                     elif key == 'h':
                         show_help = not show_help
+                    elif key == 'm':
+                        show_metrics = not show_metrics
+                        if show_metrics and metrics is None:
+                            metrics = LoopMetrics()
+                        elif not show_metrics and metrics_export is None:
+                            metrics = None  # back to zero cost
+                        scheduler.metrics = metrics
                     elif key == 'p':
                         paused = not paused
                         last_ui_refresh = 0
@@ -808,77 +4447,53 @@ def ding():
                         sys.stdout.write("\033[H\033[J")
                         sys.stdout.write("Set ping frequency in seconds (0.2 – 10.0): ")
                         sys.stdout.flush()
-                        sys.stdout.write("\033[?25h")
+                        sys.stdout.write("\033[?25h\033[?7h")
 
                         try:
-                            value = input().strip()
+                            value = console_input().strip()
                             new_interval = float(value)
                             if MIN_PING_INTERVAL <= new_interval <= MAX_PING_INTERVAL:
                                 ping_interval = new_interval
+                                scheduler.interval = new_interval
                         except ValueError:
                             pass
                         finally:
                             sys.stdout.write("\033[?25l")
+                            renderer.invalidate()
                             last_ui_refresh = 0
 
                     elif key == 'c':
                         host = hosts_order[selected_index]
                         now = time.time()
-                        host_stats[host].update({
-                            'sent': 0,
-                            'received': 0,
-                            'results': [],
-                            'consecutive_up': 0,
-                            'consecutive_down': 0,
-                            'current_state': None,
-                            'state_since': now,
-                            'warmup_left': WARMUP_PINGS,
-                            'warmup_done': False,
-                            'alerting': False,
-                            'alert_since': None,
-                            'latency': None,
-                        })
+                        host_stats.reset(host, now)
                     
                     elif key == 'a':
                         sys.stdout.write("\033[H\033[J")
                         sys.stdout.write("Add host(s) (space or comma separated): ")
                         sys.stdout.flush()
-                        sys.stdout.write("\033[?25h")
+                        sys.stdout.write("\033[?25h\033[?7h")
 
                         try:
-                            raw = input().strip()
+                            raw = console_input().strip()
                             if not raw:
                                 pass
 
                             new_hosts = []
                             for part in raw.replace(',', ' ').split():
-                                h = part.strip()
-                                if h and h not in host_stats:
-                                    new_hosts.append(h)
-
-                            now = time.time()
-                            for h in new_hosts:
-                                hosts_order.append(h)
-                                host_stats[h] = {
-                                    'sent': 0,
-                                    'received': 0,
-                                    'results': [],
-                                    'current_state': None,
-                                    'state_since': now,
-                                    'next_ping_time': now,
-                                    'consecutive_up': 0,
-                                    'consecutive_down': 0,
-                                    'warmup_left': WARMUP_PINGS,
-                                    'warmup_done': False,
-                                    'status_msg': "",
-                                    'notify_mode': 3,
-                                    'alerting': False,
-                                    'alert_since': None,
-                                    'latency': None,
-                                }
+                                try:
+                                    check_target(part)
+                                except ValueError as e:
+                                    logging.warning(f"Not adding {part!r}: {e}")
+                                    continue
+                                new_hosts.append(part)
+
+                            # Ranges and CIDR blocks are admitted by the feed
+                            feed.extend(iter_targets(new_hosts))
+                            feed.feed(host_stats, scheduler, time.time())
 
                         finally:
                             sys.stdout.write("\033[?25l")
+                            renderer.invalidate()
                             last_ui_refresh = 0
 
                     elif key == 'e' and hosts_order:
@@ -887,49 +4502,24 @@ def ding():
                         sys.stdout.write("\033[H\033[J")
                         sys.stdout.write(f"Edit host [{old_host}] (leave empty to cancel): ")
                         sys.stdout.flush()
-                        sys.stdout.write("\033[?25h")
+                        sys.stdout.write("\033[?25h\033[?7h")
 
                         try:
-                            new_host = input().strip()
+                            new_host = console_input().strip()
                             if not new_host or new_host == old_host:
                                 pass
                             else:
                                 # Cancel pending ping
-                                fut = futures.pop(old_host, None)
-                                if fut:
-                                    try:
-                                        fut.cancel()
-                                    except Exception:
-                                        pass
-
-                                # Replace in order list
-                                hosts_order[selected_index] = new_host
+                                scheduler.cancel(old_host)
 
-                                # Reset stats
+                                # Replace in order list with fresh stats
                                 now = time.time()
-                                host_stats[new_host] = {
-                                    'sent': 0,
-                                    'received': 0,
-                                    'results': [],
-                                    'current_state': None,
-                                    'state_since': now,
-                                    'next_ping_time': now,
-                                    'consecutive_up': 0,
-                                    'consecutive_down': 0,
-                                    'warmup_left': WARMUP_PINGS,
-                                    'warmup_done': False,
-                                    'status_msg': "",
-                                    'notify_mode': 3,
-                                    'alerting': False,
-                                    'alert_since': None,
-                                    'latency': None,
-                                }
-
-                                # Remove old entry
-                                host_stats.pop(old_host, None)
+                                if host_stats.rename(old_host, new_host, now) is not None:
+                                    scheduler.add(new_host, now)
 
                         finally:
                             sys.stdout.write("\033[?25l")
+                            renderer.invalidate()
                             last_ui_refresh = 0
 
                     elif key == 'r' and hosts_order:
@@ -939,15 +4529,9 @@ def ding():
                             pending_remove = host
                         else:
                             # Confirmed removal
-                            fut = futures.pop(host, None)
-                            if fut:
-                                try:
-                                    fut.cancel()
-                                except Exception:
-                                    pass
+                            scheduler.cancel(host)
 
-                            host_stats.pop(host, None)
-                            hosts_order.pop(selected_index)
+                            host_stats.remove(host)
 
                             pending_remove = None
 
@@ -959,20 +4543,30 @@ def ding():
                         last_ui_refresh = 0
 
                     if key != 'r' and pending_remove:
-                        host_stats.get(pending_remove, {}).pop('_pending_remove', None)
                         pending_remove = None
 
                 # Force immediate redraw after keypress
                 last_ui_refresh = 0
-
-            # Minimal sleep to keep CPU low but responsive
-            time.sleep(0.01)
+            if metrics is not None:
+                metrics.mark('input')
+
+            # === 4. Sleep until a probe finishes, a ping is due, or input needs polling ===
+            scheduler.wait(INPUT_POLL_INTERVAL, paused)
+            if metrics is not None:
+                metrics.mark('wait')
+                if metrics.end_loop(scheduler):
+                    if metrics_export is not None:
+                        metrics_export.write(metrics.snapshot)
+                    if show_metrics:
+                        last_ui_refresh = 0
 
     except Exception:
+        import traceback
         traceback.print_exc()
     finally:
         # Cleanup
-        sys.stdout.write("\033[?25h")  # Show cursor
+        console_restore()
+        sys.stdout.write("\033[?25h\033[?7h")  # Show cursor, autowrap back on
         sys.stdout.write("\033[H\033[J")  # Final clear
         sys.stdout.flush()
 
@@ -982,27 +4576,30 @@ def ding():
         except Exception:
             pass
         try:
-            executor.shutdown(wait=True, cancel_futures=True)
+            engine.close()
+        except Exception:
+            pass
+        dns_cache.close()
+        try:
+            if store is not None:
+                store.close()
+        except Exception:
+            pass
+        try:
+            if alerts is not None:
+                alerts.close()
+        except Exception:
+            pass
+        try:
+            if exporter is not None:
+                exporter.close()
         except Exception:
             pass
         print("ding stopped.")
 
 if __name__ == "__main__":
-    # Auto-elevate if not admin
-    if not is_admin():
-        print("Requesting admin privileges...")
-
-        # Re-launch the script with admin rights
-        params = " ".join([f'"{arg}"' for arg in sys.argv[1:]])
-        ctypes.windll.shell32.ShellExecuteW(
-            None,
-            "runas",                                # triggers UAC prompt
-            sys.executable,                         # python.exe
-            f'"{sys.argv[0]}" {params}',
-            None,
-            1
-        )
-        sys.exit(0)  # Exit the non-admin process
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()  # --workers in a PyInstaller build
 
-    # Now runs as admin
     ding()
\ No newline at end of file